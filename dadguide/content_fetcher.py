@@ -0,0 +1,114 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import shutil
+from typing import Optional
+
+import aiohttp
+
+logger = logging.getLogger('red.padbot-cogs.dadguide.content_fetcher')
+
+
+class ContentFetcher(object):
+    """Keeps local copies of remote files up to date and tracks the hash of their contents.
+
+    Downloads use conditional requests (ETag/Last-Modified) so unchanged files aren't
+    transferred again, and the sha256 of every file is remembered so callers can tell whether
+    anything moved without rereading it.
+    """
+
+    def __init__(self, state_file: str):
+        self.state_file = state_file
+        # url -> {'file', 'sha256', 'etag', 'last_modified'}
+        self._state = {}
+        if os.path.exists(state_file):
+            try:
+                with open(state_file, encoding='utf-8') as f:
+                    self._state = json.load(f)
+            except (ValueError, OSError) as ex:
+                logger.warning('ignoring unreadable fetch state %s: %s', state_file, ex)
+
+    async def fetch(self, url: str, file_path: str) -> str:
+        """Brings file_path up to date with url and returns the sha256 of its contents."""
+        entry = self._state.get(url)
+        headers = {}
+        if entry and entry['file'] == file_path and os.path.exists(file_path):
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304:
+                    return entry['sha256']
+                response.raise_for_status()
+                data = await response.read()
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+
+        sha256 = hashlib.sha256(data).hexdigest()
+        if not (entry and entry['sha256'] == sha256 and os.path.exists(file_path)):
+            logger.info('%s changed, writing %s', url, file_path)
+            _write_file(file_path, data)
+        self._set_entry(url, file_path, sha256, etag, last_modified)
+        return sha256
+
+    def copy_local(self, source_path: str, file_path: str) -> str:
+        """Like fetch, for a file that's configured as a local path instead of a url."""
+        sha256 = _hash_file(source_path)
+        entry = self._state.get(source_path)
+        if not (entry and entry['sha256'] == sha256 and os.path.exists(file_path)):
+            tmp_file = file_path + '.tmp'
+            shutil.copy2(source_path, tmp_file)
+            os.replace(tmp_file, file_path)
+        self._set_entry(source_path, file_path, sha256, None, None)
+        return sha256
+
+    def content_hash(self, url: str) -> Optional[str]:
+        """The sha256 of the last fetched copy of url, if it's still on disk."""
+        entry = self._state.get(url)
+        if entry is None or not os.path.exists(entry['file']):
+            return None
+        return entry['sha256']
+
+    def csv_reader(self, url: str):
+        """Reads the last fetched copy of a csv sheet, without touching the network."""
+        with open(self._state[url]['file'], encoding='utf-8', newline='') as f:
+            rows = list(csv.reader(f, delimiter=','))
+        return iter(rows)
+
+    def forget(self, url: str):
+        """Drops what's known about url, so the next fetch downloads it unconditionally."""
+        self._state.pop(url, None)
+        self._save_state()
+
+    def _set_entry(self, url, file_path, sha256, etag, last_modified):
+        new_entry = {'file': file_path, 'sha256': sha256, 'etag': etag, 'last_modified': last_modified}
+        if self._state.get(url) != new_entry:
+            self._state[url] = new_entry
+            self._save_state()
+
+    def _save_state(self):
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._state, f)
+        os.replace(tmp_file, self.state_file)
+
+
+def _write_file(file_path: str, data: bytes):
+    # Readers never see a half written file, and anything hard linked to the old one keeps it
+    tmp_file = file_path + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_file, file_path)
+
+
+def _hash_file(file_path: str) -> str:
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
@@ -12,18 +12,24 @@ import difflib
 import json
 import logging
 import os
-import shutil
 import tsutils
 from io import BytesIO
 from collections import defaultdict
 from redbot.core import checks, data_manager
 from redbot.core import commands
+from redbot.core.utils.chat_formatting import box, pagify
 
 from .database_manager import *
 from .models.monster_stats import monster_stats, MonsterStatModifierInput
 from .old_monster_index import MonsterIndex
-from .monster_index import MonsterIndex2
-from .database_loader import load_database
+from .monster_index import MonsterIndex2, NICKNAME_OVERRIDES_SHEET, GROUP_TREENAMES_OVERRIDES_SHEET, \
+    PANTHNAME_OVERRIDES_SHEET, NAME_TOKEN_ALIAS_SHEET
+from .content_fetcher import ContentFetcher
+from .database_loader import diff_database, load_database, unload_database
+from .data_generation import DataGeneration
+from .database_context import DbContext
+from .database_snapshot import compute_snapshot_key, load_snapshot, save_snapshot
+from .memory_report import monster_memory_report
 from . import token_mappings
 
 from .models.monster_model import MonsterModel
@@ -43,20 +49,38 @@ try:
     TREENAMES_EXPORT_PATH = _data_file('base_names.json')
     TRANSLATEDNAMES_EXPORT_PATH = _data_file('translated_names.json')
 
-    SHEETS_PATTERN = 'https://docs.google.com/spreadsheets/d/1EoZJ3w5xsXZ67kmarLE4vfrZSIIIAfj04HXeZVST3eY/pub?gid={}&single=true&output=csv'
-    NICKNAME_OVERRIDES_SHEET = SHEETS_PATTERN.format('0')
-    GROUP_TREENAMES_OVERRIDES_SHEET = SHEETS_PATTERN.format('2070615818')
-    PANTHNAME_OVERRIDES_SHEET = SHEETS_PATTERN.format('959933643')
-
     NICKNAME_FILE_PATTERN = _data_file(CSV_FILE_PATTERN.format('nicknames'))
     TREENAME_FILE_PATTERN = _data_file(CSV_FILE_PATTERN.format('treenames'))
     PANTHNAME_FILE_PATTERN = _data_file(CSV_FILE_PATTERN.format('panthnames'))
+    NAME_TOKEN_ALIAS_FILE_PATTERN = _data_file(CSV_FILE_PATTERN.format('nametokenaliases'))
 
     DB_DUMP_URL = 'https://d1kpnpud0qoyxf.cloudfront.net/db/dadguide.sqlite'
     DB_DUMP_FILE = _data_file('dadguide.sqlite')
+
+    # Override sheets, mapped to where their latest copy is kept
+    OVERRIDE_SOURCES = [
+        (NICKNAME_OVERRIDES_SHEET, NICKNAME_FILE_PATTERN),
+        (GROUP_TREENAMES_OVERRIDES_SHEET, TREENAME_FILE_PATTERN),
+        (PANTHNAME_OVERRIDES_SHEET, PANTHNAME_FILE_PATTERN),
+        (NAME_TOKEN_ALIAS_SHEET, NAME_TOKEN_ALIAS_FILE_PATTERN),
+    ]
+    # ETags and content hashes of everything above
+    FETCH_STATE_FILE = _data_file('fetch_state.json')
+
+    # Pickled graph + indexes, reused as long as none of the files they were built from change
+    SNAPSHOT_FILE = _data_file('dadguide_snapshot.pickle')
 except RuntimeError:
     pass
 
+# Server-restricted id1/id2 indexes that are built (and snapshotted) alongside the main one
+SERVER_INDEX_FILTERS = {
+    'na': lambda m: m.on_na,
+    'jp': lambda m: m.on_jp,
+}
+
+# Past this many changed monsters a refresh rebuilds everything instead of patching
+INCREMENTAL_REFRESH_MAX_MONSTERS = 1000
+
 
 class Dadguide(commands.Cog):
     """Dadguide database manager"""
@@ -79,15 +103,41 @@ class Dadguide(commands.Cog):
         # Map of google-translated JP names to EN names
         self.translated_names = {}
 
-        self.database = None
-        self.index = None  # type: MonsterIndex
-        self.index2 = None  # type: MonsterIndex2
+        # The database and indexes currently being served, replaced whole by each refresh
+        self.generation = None  # type: DataGeneration
+        self._refresh_lock = asyncio.Lock()
+        self.fetcher = ContentFetcher(FETCH_STATE_FILE)
 
         self.monster_stats = monster_stats
         self.MonsterStatModifierInput = MonsterStatModifierInput
 
         self.token_maps = token_mappings
 
+    @property
+    def database(self) -> DbContext:
+        return self.generation.database if self.generation else None
+
+    @property
+    def index(self) -> MonsterIndex:
+        return self.generation.index if self.generation else None
+
+    @property
+    def server_indexes(self) -> dict:
+        return self.generation.server_indexes if self.generation else {}
+
+    @property
+    def index2(self) -> MonsterIndex2:
+        return self.generation.index2 if self.generation else None
+
+    @property
+    def generation_number(self) -> int:
+        """Exported number of the data generation being served, it changes on every refresh.
+
+        Client cogs can compare it to decide whether anything they derived from the database
+        or indexes is stale.
+        """
+        return self.generation.number if self.generation else 0
+
     async def wait_until_ready(self):
         """Wait until the Dadguide cog is ready.
 
@@ -108,19 +158,13 @@ class Dadguide(commands.Cog):
         """
         return
 
-    async def create_index(self, accept_filter=None):
-        """Exported function that allows a client cog to create an id1/2 monster index"""
+    async def get_index(self, server=None):
+        """Exported function that returns the prebuilt id1/2 index, optionally for 'na' or 'jp' only"""
         await self.wait_until_ready()
-        return await MonsterIndex(self.database,
-                                  self.nickname_overrides,
-                                  self.treename_overrides,
-                                  self.panthname_overrides,
-                                  accept_filter=accept_filter)
-
-    async def create_index2(self):
-        """Exported function that allows a client cog to create an id3 monster index"""
-        await self.wait_until_ready()
-        return await MonsterIndex2(self.database.get_all_monsters(False), self.database)
+        generation = self.generation
+        if server is None:
+            return generation.index
+        return generation.server_indexes[server]
 
     def get_monster(self, monster_id: int) -> MonsterModel:
         """Exported function that allows a client cog to get a full MonsterModel by monster_id"""
@@ -130,16 +174,24 @@ class Dadguide(commands.Cog):
         # Manually nulling out database because the GC for cogs seems to be pretty shitty
         logger.info('Unloading Dadguide')
         if self.database:
-            self.database.close()
-        self.database = None
+            unload_database(self.database)
+        self.generation = None
         self._is_ready.clear()
 
     async def reload_data_task(self):
+        # Serve lookups from the last snapshot while the first refresh runs
+        try:
+            generation = await self._run_in_worker(self._load_stored_snapshot)
+            if generation:
+                self._publish(generation)
+        except Exception as ex:
+            logger.exception("dadguide snapshot load failed: %s", ex)
         await self.bot.wait_until_ready()
 
         # We already had a copy of the database at startup, signal that we're ready now.
         if self.database and self.database.has_database():
             logger.info('Using stored database at load')
+            self._is_ready.set()
 
         while self == self.bot.get_cog('Dadguide'):
             short_wait = False
@@ -159,23 +211,159 @@ class Dadguide(commands.Cog):
                 raise ex
 
     async def reload_config_files(self):
-        os.remove(NICKNAME_FILE_PATTERN)
-        os.remove(TREENAME_FILE_PATTERN)
-        os.remove(PANTHNAME_FILE_PATTERN)
+        for sheet_url, _ in OVERRIDE_SOURCES:
+            self.fetcher.forget(sheet_url)
         await self.download_and_refresh_nicknames()
 
     async def download_and_refresh_nicknames(self):
-        if self.settings.data_file():
-            logger.info('Copying dg data file')
-            shutil.copy2(self.settings.data_file(), DB_DUMP_FILE)
-        else:
-            logger.info('Downloading dg data files')
-            await self._download_files()
+        # The loop and reload_config_files can both trigger a refresh
+        async with self._refresh_lock:
+            await self._download_and_refresh_nicknames()
+
+    async def _download_and_refresh_nicknames(self):
+        logger.info('Downloading dg data files')
+        db_hash = await self._download_files()
 
         logger.info('Downloading dg name override files')
-        await self._download_override_files()
+        override_hashes = await self._download_override_files()
+
+        # Nothing the generation was built from moved, so there's nothing to reload or rebuild
+        snapshot_key = compute_snapshot_key(db_hash, *override_hashes)
+        if self.generation and snapshot_key == self.generation.snapshot_key:
+            logger.info('dg data unchanged, skipping rebuild')
+            return
+        overrides_key = compute_snapshot_key(*override_hashes)
 
         logger.info('Loading dg name overrides')
+        self._load_override_files()
+
+        # Building is CPU bound, so it runs on a worker thread and commands keep being served
+        # from the current generation until the new one is swapped in
+        generation = await self._run_in_worker(self._build_generation, self.generation, db_hash,
+                                               snapshot_key, overrides_key)
+        self._publish(generation)
+
+        logger.info('Writing dg monster computed names')
+        self.write_monster_computed_names()
+
+        logger.info('Done refreshing dg data')
+
+    @staticmethod
+    def _run_in_worker(build_func, *args):
+        """Runs an async build function to completion on its own event loop in a worker thread"""
+        return asyncio.get_event_loop().run_in_executor(None, lambda: asyncio.run(build_func(*args)))
+
+    def _publish(self, generation: DataGeneration):
+        # The replaced generation's dump is released once the last reference to it is gone
+        self.generation = generation
+        logger.info('Serving dg data generation %s', generation.number)
+
+    async def _build_generation(self, base_generation, db_hash, snapshot_key, overrides_key):
+        number = base_generation.number + 1 if base_generation else 1
+
+        generation = self._load_snapshot(number, db_hash, snapshot_key, overrides_key)
+        if generation:
+            logger.info('Loaded dg database and indexes from snapshot')
+            return generation
+
+        generation = await self._refresh_incrementally(number, base_generation, db_hash,
+                                                       snapshot_key, overrides_key)
+        if generation is None:
+            logger.info('Loading dg database')
+            database = load_database(db_hash)
+            logger.info('Building dg monster index')
+            index = await MonsterIndex(database, self.nickname_overrides,
+                                       self.treename_overrides, self.panthname_overrides)
+            server_indexes = {}
+            for server, accept_filter in SERVER_INDEX_FILTERS.items():
+                server_indexes[server] = await MonsterIndex(database, self.nickname_overrides,
+                                                            self.treename_overrides,
+                                                            self.panthname_overrides,
+                                                            accept_filter=accept_filter)
+            index2 = await MonsterIndex2(database.get_all_monsters(False), database, self.fetcher)
+            generation = DataGeneration(number, database, index, server_indexes, index2,
+                                        snapshot_key, overrides_key)
+
+        logger.info('Writing dg snapshot')
+        self._save_snapshot(generation)
+        return generation
+
+    async def _refresh_incrementally(self, number, base_generation, db_hash, snapshot_key,
+                                     overrides_key):
+        """Patches base_generation for just the evo trees that changed in the new dump.
+
+        Returns None if the changes can't be patched in and everything needs to be rebuilt.
+        """
+        if not base_generation or overrides_key != base_generation.overrides_key:
+            return None
+        delta = diff_database(base_generation.database)
+        if delta is None:
+            logger.info('dg database schema changed, rebuilding')
+            return None
+        logger.info('dg database delta: %s', delta)
+        if len(delta.monster_ids) > INCREMENTAL_REFRESH_MAX_MONSTERS:
+            return None
+        if delta.table_changed('series'):
+            # Series names feed the pantheon modifiers of every monster in index2
+            return None
+
+        logger.info('Patching dg database')
+        old_graph = base_generation.database.graph
+        database = load_database(db_hash, graph=old_graph, changed_monster_ids=delta.monster_ids)
+        if self._used_series_ids(database) != self._used_series_ids(base_generation.database):
+            # index2 only builds pantheon modifiers and multi-word tokens for series with monsters
+            # in them, so a series gaining its first or losing its last monster touches everyone
+            logger.info('dg monster series changed, rebuilding')
+            unload_database(database)
+            return None
+        tree_ids = delta.affected_tree_ids(old_graph, database.graph)
+        logger.info('Patching dg monster indexes for %s monsters', len(tree_ids))
+        index = await base_generation.index.patched(database, tree_ids, self.nickname_overrides,
+                                                    self.treename_overrides, self.panthname_overrides)
+        server_indexes = {}
+        for server, accept_filter in SERVER_INDEX_FILTERS.items():
+            server_indexes[server] = await base_generation.server_indexes[server].patched(
+                database, tree_ids, self.nickname_overrides, self.treename_overrides,
+                self.panthname_overrides, accept_filter=accept_filter)
+        index2 = await base_generation.index2.patched(database, tree_ids)
+        return DataGeneration(number, database, index, server_indexes, index2,
+                              snapshot_key, overrides_key)
+
+    @staticmethod
+    def _used_series_ids(database: DbContext) -> set:
+        return {m.series_id for m in database.get_all_monsters()}
+
+    @staticmethod
+    def _save_snapshot(generation: DataGeneration):
+        save_snapshot(SNAPSHOT_FILE, generation.snapshot_key, {
+            'graph': generation.database.graph,
+            'index': generation.index,
+            'server_indexes': generation.server_indexes,
+            'index2': generation.index2,
+        })
+
+    async def _load_stored_snapshot(self):
+        # Uses whatever was fetched last, the refresh loop checks for anything newer
+        db_hash = self.fetcher.content_hash(self.settings.data_file() or DB_DUMP_URL)
+        override_hashes = [self.fetcher.content_hash(url) for url, _ in OVERRIDE_SOURCES]
+        snapshot_key = compute_snapshot_key(db_hash, *override_hashes)
+        if snapshot_key is None:
+            return None
+        self._load_override_files()
+        return self._load_snapshot(1, db_hash, snapshot_key, compute_snapshot_key(*override_hashes))
+
+    @staticmethod
+    def _load_snapshot(number, db_hash, snapshot_key, overrides_key):
+        snapshot = load_snapshot(SNAPSHOT_FILE, snapshot_key)
+        if snapshot is None:
+            return None
+        database = load_database(db_hash, graph=snapshot['graph'])
+        for index in (snapshot['index'], *snapshot['server_indexes'].values()):
+            index.db_context = database
+        return DataGeneration(number, database, snapshot['index'], snapshot['server_indexes'],
+                              snapshot['index2'], snapshot_key, overrides_key)
+
+    def _load_override_files(self):
         nickname_overrides = self._csv_to_tuples(NICKNAME_FILE_PATTERN, 5)
         treename_overrides = self._csv_to_tuples(TREENAME_FILE_PATTERN, 5)
         panthname_overrides = self._csv_to_tuples(PANTHNAME_FILE_PATTERN, 3)
@@ -193,18 +381,6 @@ class Dadguide(commands.Cog):
         self.panthname_overrides = {x[1].lower(): x[2].lower() for x in panthname_overrides}
         self.panthname_overrides.update({v: v for _, v in self.panthname_overrides.items()})
 
-        logger.info('Loading dg database')
-        self.database = load_database(self.database)
-        logger.info('Building dg monster index')
-        self.index = await MonsterIndex(self.database, self.nickname_overrides,
-                                        self.treename_overrides, self.panthname_overrides)
-        self.index2 = await MonsterIndex2(self.database.get_all_monsters(False), self.database)
-
-        logger.info('Writing dg monster computed names')
-        self.write_monster_computed_names()
-
-        logger.info('Done refreshing dg data')
-
     def write_monster_computed_names(self):
         results = {}
         for name, nm in self.index.all_entries.items():
@@ -242,18 +418,13 @@ class Dadguide(commands.Cog):
                 results.append(data)
         return results
 
-    async def _download_files(self):
-        one_hour_secs = 1 * 60 * 60
-        await tsutils.async_cached_dadguide_request(DB_DUMP_FILE, DB_DUMP_URL, one_hour_secs)
+    async def _download_files(self) -> str:
+        if self.settings.data_file():
+            return self.fetcher.copy_local(self.settings.data_file(), DB_DUMP_FILE)
+        return await self.fetcher.fetch(DB_DUMP_URL, DB_DUMP_FILE)
 
-    async def _download_override_files(self):
-        one_hour_secs = 1 * 60 * 60
-        await tsutils.async_cached_plain_request(
-            NICKNAME_FILE_PATTERN, NICKNAME_OVERRIDES_SHEET, one_hour_secs)
-        await tsutils.async_cached_plain_request(
-            TREENAME_FILE_PATTERN, GROUP_TREENAMES_OVERRIDES_SHEET, one_hour_secs)
-        await tsutils.async_cached_plain_request(
-            PANTHNAME_FILE_PATTERN, PANTHNAME_OVERRIDES_SHEET, one_hour_secs)
+    async def _download_override_files(self) -> list:
+        return [await self.fetcher.fetch(url, file_path) for url, file_path in OVERRIDE_SOURCES]
 
     @commands.group()
     @checks.is_owner()
@@ -267,6 +438,17 @@ class Dadguide(commands.Cog):
         self.settings.set_data_file(data_file)
         await ctx.tick()
 
+    @dadguide.command()
+    @checks.is_owner()
+    async def memory(self, ctx):
+        """Show how much memory the monster models of the current generation use."""
+        await self.wait_until_ready()
+        monsters = self.database.get_all_monsters(False)
+        # Walking every object takes a while, don't block the bot while doing it
+        report = await asyncio.get_event_loop().run_in_executor(None, monster_memory_report, monsters)
+        for page in pagify(report):
+            await ctx.send(box(page))
+
 
 class DadguideSettings(tsutils.CogSettings):
     def make_default_settings(self):
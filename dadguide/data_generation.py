@@ -0,0 +1,22 @@
+from .database_context import DbContext
+
+
+class DataGeneration(object):
+    """A database together with the indexes built from it.
+
+    Generations are never modified once they've been published. Every refresh builds a new one
+    and swaps it in whole, so a reader that holds on to a generation always sees a consistent
+    database and set of indexes.
+    """
+
+    def __init__(self, number: int, database: DbContext, index, server_indexes: dict, index2,
+                 snapshot_key: str, overrides_key: str):
+        self.number = number
+        self.database = database
+        self.index = index
+        self.server_indexes = server_indexes
+        self.index2 = index2
+
+        # Keys of the input files the database and indexes were built from
+        self.snapshot_key = snapshot_key
+        self.overrides_key = overrides_key
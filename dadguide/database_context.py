@@ -1,10 +1,13 @@
-from typing import Generator, List
+from collections import defaultdict
+from typing import Generator, List, Tuple
 
 from .database_manager import DadguideDatabase
 from .models.awoken_skill_model import AwokenSkillModel
 from .models.dungeon_model import DungeonModel
+from .models.monster_stats import MonsterStatsTable
 from .models.scheduled_event_model import ScheduledEventModel
 from .monster_graph import MonsterGraph
+from .stat_leaderboard import StatLeaderboard
 
 SCHEDULED_EVENT_QUERY = """SELECT
   schedule.*,
@@ -15,11 +18,43 @@ SCHEDULED_EVENT_QUERY = """SELECT
 FROM
   schedule LEFT OUTER JOIN dungeons ON schedule.dungeon_id = dungeons.dungeon_id"""
 
+# Columns monsters can be looked up by without scanning all of them, mapped to the values a
+# monster is filed under
+INDEXED_COLUMNS = {
+    'series_id': lambda m: (m.series_id,),
+    'active_skill_id': lambda m: (m.active_skill_id,),
+    'leader_skill_id': lambda m: (m.leader_skill_id,),
+    'attribute': lambda m: {m.attr1, m.attr2},
+    'type': lambda m: m.types,
+    'rarity': lambda m: (m.rarity,),
+}
+
 
 class DbContext(object):
     def __init__(self, database: DadguideDatabase, graph: MonsterGraph):
         self.database = database
         self.graph = graph
+        # Every monster and its id, in monster_id order, so listing them never hits sqlite
+        self._monsters = ()
+        self._monster_ids = ()
+        # column -> value -> monsters with that value, in monster_id order
+        self._monsters_by_column = {}
+        # Built on first use, most generations never need it
+        self._stats_table = None
+        self._stat_leaderboard = None
+        if graph is not None:
+            self._monsters = tuple(graph.get_all_monsters())
+            self._monster_ids = tuple(m.monster_id for m in self._monsters)
+            self._build_column_indexes()
+
+    def _build_column_indexes(self):
+        self._monsters_by_column = {column: defaultdict(list) for column in INDEXED_COLUMNS}
+        for m in self._monsters:
+            for column, get_values in INDEXED_COLUMNS.items():
+                for value in get_values(m):
+                    self._monsters_by_column[column][value].append(m)
+        for column in INDEXED_COLUMNS:
+            self._monsters_by_column[column] = dict(self._monsters_by_column[column])
 
     def get_awoken_skill_ids(self):
         SELECT_AWOKEN_SKILL_IDS = 'SELECT awoken_skill_id from awoken_skills'
@@ -27,33 +62,67 @@ class DbContext(object):
                 self.database.query_many(
                     SELECT_AWOKEN_SKILL_IDS, (), as_generator=True)]
 
-    def get_monsters_where(self, f):
-        return [m for m in self.get_all_monsters() if f(m)]
+    def get_monsters_where(self, f=None, **column_values):
+        """Monsters matching f and having every value in column_values.
 
-    def get_first_monster_where(self, f):
-        ms = self.get_monsters_where(f)
-        if ms:
-            return min(ms, key=lambda m: m.monster_id)
+        The column_values keys are INDEXED_COLUMNS, looked up in the indexes instead of checking
+        every monster. f is only run on the monsters left after that.
+        """
+        if column_values:
+            monsters = self._get_indexed_monsters(column_values)
+        else:
+            monsters = self.get_all_monsters()
+        if f is None:
+            return list(monsters)
+        return [m for m in monsters if f(m)]
+
+    def get_first_monster_where(self, f=None, **column_values):
+        # Monsters are kept in monster_id order, so the first match has the lowest id
+        monsters = self._get_indexed_monsters(column_values) if column_values else self._monsters
+        return next((m for m in monsters if f is None or f(m)), None)
 
     def get_monsters_by_series(self, series_id: int):
-        return self.get_monsters_where(lambda m: m.series_id == series_id)
+        return self.get_monsters_where(series_id=series_id)
 
     def get_monsters_by_active(self, active_skill_id: int):
-        return self.get_monsters_where(lambda m: m.active_skill_id == active_skill_id)
+        return self.get_monsters_where(active_skill_id=active_skill_id)
+
+    def get_monsters_by_leader(self, leader_skill_id: int):
+        return self.get_monsters_where(leader_skill_id=leader_skill_id)
+
+    def _get_indexed_monsters(self, column_values: dict):
+        candidates = [self._monsters_by_column[column].get(value, [])
+                      for column, value in column_values.items()]
+        # Walk the smallest list and check the rest of the values on each monster
+        monsters = min(candidates, key=len)
+        return [m for m in monsters
+                if all(value in INDEXED_COLUMNS[column](m) for column, value in column_values.items())]
+
+    def get_stats_table(self) -> MonsterStatsTable:
+        """Stat columns of every monster, in the same order as get_all_monsters."""
+        if self._stats_table is None:
+            self._stats_table = MonsterStatsTable(self._monsters)
+        return self._stats_table
+
+    def get_stat_leaderboard(self) -> StatLeaderboard:
+        if self._stat_leaderboard is None:
+            self._stat_leaderboard = StatLeaderboard(self._monsters, self.get_stats_table())
+        return self._stat_leaderboard
 
     def get_all_monster_ids_query(self, as_generator=True):
-        query = self.database.query_many(
-            self.database.select_builder(tables={'monsters': ('monster_id',)}), (),
-            as_generator=as_generator)
         if as_generator:
-            return map(lambda m: m.monster_id, query)
-        return [m.monster_id for m in query]
+            return iter(self._monster_ids)
+        return list(self._monster_ids)
+
+    def get_all_monster_ids(self) -> Tuple[int, ...]:
+        """Sorted ids of every monster, shared by all callers."""
+        return self._monster_ids
 
     def get_all_monsters(self, as_generator=True):
-        monsters = (self.graph.get_monster(mid) for mid in self.get_all_monster_ids_query())
+        # The generator walks the cached models, it doesn't touch sqlite
         if not as_generator:
-            return [*monsters]
-        return monsters
+            return list(self._monsters)
+        return iter(self._monsters)
 
     def get_all_events(self) -> Generator[ScheduledEventModel, None, None]:
         result = self.database.query_many(SCHEDULED_EVENT_QUERY, ())
@@ -0,0 +1,134 @@
+import json
+import sqlite3 as lite
+from collections import OrderedDict
+from typing import Optional
+
+# Tables the monster graph is built from, mapped to the columns of a changed row that hold the
+# ids of the monsters it affects
+MONSTER_ID_COLUMNS = OrderedDict([
+    ('monsters', ('monster_id',)),
+    ('evolutions', ('from_id', 'to_id')),
+    ('awakenings', ('monster_id',)),
+    ('drops', ('monster_id',)),
+])
+
+# Tables whose rows are shared between monsters, mapped to their id column and a query for the
+# monsters that refer to a set of those ids
+REFERENCED_TABLES = OrderedDict([
+    ('active_skills', ('active_skill_id',
+                       'SELECT monster_id FROM {db}.monsters WHERE active_skill_id IN ({ids})')),
+    ('leader_skills', ('leader_skill_id',
+                       'SELECT monster_id FROM {db}.monsters WHERE leader_skill_id IN ({ids})')),
+    ('series', ('series_id',
+                'SELECT monster_id FROM {db}.monsters WHERE series_id IN ({ids})')),
+    ('awoken_skills', ('awoken_skill_id',
+                       'SELECT monster_id FROM {db}.awakenings WHERE awoken_skill_id IN ({ids})')),
+    # Evo gems are joined onto the monster they're named after
+    ('exchanges', ('target_monster_id',
+                   "SELECT m.monster_id FROM {db}.monsters AS m"
+                   " JOIN {db}.monsters AS t ON m.name_ja || 'の希石' = t.name_ja"
+                   " WHERE t.monster_id IN ({ids})")),
+])
+
+# Egg machine contents are a json list of '(monster_id)' strings
+EGG_TABLE = 'egg_machines'
+
+
+class DatabaseDelta(object):
+    def __init__(self):
+        self.changed_rows = OrderedDict()
+        self.monster_ids = set()
+
+    def size(self) -> int:
+        return sum(self.changed_rows.values())
+
+    def table_changed(self, table: str) -> bool:
+        return self.changed_rows.get(table, 0) > 0
+
+    def affected_tree_ids(self, *graphs) -> set:
+        """The changed monsters plus everything sharing an alt tree with them in any of graphs.
+
+        The JP counterpart (id - 10000) of a changed monster is pulled in too, since whether it
+        exists changes the NA monster's modifiers.
+        """
+        tree_ids = set()
+        for monster_id in self.monster_ids:
+            for related_id in (monster_id, monster_id - 10000):
+                tree_ids.add(related_id)
+                for graph in graphs:
+                    tree_ids.update(graph.get_alt_ids_by_id(related_id) or ())
+        return tree_ids
+
+    def __str__(self):
+        tables = ', '.join('{} {}'.format(table, count)
+                           for table, count in self.changed_rows.items() if count)
+        return '{} changed rows ({}) touching {} monsters'.format(
+            self.size(), tables or 'none', len(self.monster_ids))
+
+
+def diff_databases(old_file: str, new_file: str) -> Optional[DatabaseDelta]:
+    """Compares two dadguide dumps table by table.
+
+    Returns None if the schema changed, in which case nothing can be patched.
+    """
+    con = lite.connect(new_file)
+    try:
+        con.execute('ATTACH DATABASE ? AS old', (old_file,))
+        delta = DatabaseDelta()
+        for table in [*MONSTER_ID_COLUMNS, *REFERENCED_TABLES, EGG_TABLE]:
+            columns = _table_columns(con, 'main', table)
+            if not columns or columns != _table_columns(con, 'old', table):
+                return None
+            added, removed = _changed_rows(con, table)
+            rows = added + removed
+            delta.changed_rows[table] = len(rows)
+            if not rows:
+                continue
+
+            if table in MONSTER_ID_COLUMNS:
+                for column in MONSTER_ID_COLUMNS[table]:
+                    idx = columns.index(column)
+                    delta.monster_ids.update(r[idx] for r in rows if r[idx] is not None)
+                if table == 'monsters':
+                    # Renaming a monster can also move the evo gem of another one
+                    ids = _id_list(r[columns.index('monster_id')] for r in rows)
+                    delta.monster_ids.update(_query_both(con, REFERENCED_TABLES['exchanges'][1], ids))
+            elif table in REFERENCED_TABLES:
+                id_column, query = REFERENCED_TABLES[table]
+                ids = _id_list(r[columns.index(id_column)] for r in rows)
+                delta.monster_ids.update(_query_both(con, query, ids))
+            else:
+                # Only monsters that entered or left a machine type changed
+                delta.monster_ids.update(monster_id for _, monster_id in
+                                         _egg_contents(added, columns) ^ _egg_contents(removed, columns))
+        return delta
+    finally:
+        con.close()
+
+
+def _table_columns(con, db: str, table: str) -> list:
+    return [r[1] for r in con.execute('PRAGMA {}.table_info({})'.format(db, table))]
+
+
+def _changed_rows(con, table: str):
+    # Rows only present on one side, so an edited row shows up once with each version
+    query = 'SELECT * FROM {0}.{2} EXCEPT SELECT * FROM {1}.{2}'
+    return (con.execute(query.format('main', 'old', table)).fetchall(),
+            con.execute(query.format('old', 'main', table)).fetchall())
+
+
+def _egg_contents(rows, columns) -> set:
+    type_idx = columns.index('egg_machine_type_id')
+    contents_idx = columns.index('contents')
+    return {(r[type_idx], int(m[1:-1])) for r in rows for m in json.loads(r[contents_idx])}
+
+
+def _id_list(ids) -> str:
+    return ','.join(str(int(i)) for i in set(ids) if i is not None) or 'NULL'
+
+
+def _query_both(con, query: str, ids: str) -> set:
+    monster_ids = set()
+    for db in ('main', 'old'):
+        monster_ids.update(r[0] for r in con.execute(query.format(db=db, ids=ids)))
+    return monster_ids
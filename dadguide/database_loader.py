@@ -1,28 +1,99 @@
-import shutil
+import glob
 import os
+import shutil
+import threading
+import weakref
+from collections import Counter
 
 from redbot.core import data_manager
 
 from .database_manager import DadguideDatabase
 from .database_context import DbContext
+from .database_diff import diff_databases
 from .monster_graph import MonsterGraph
 
+# Number of live databases per versioned dump file. Generations built from the same dump share
+# one file, which is deleted once the last of them is released.
+_dump_refs = Counter()
+# Databases are loaded on build workers and released from the bot's loop or by the GC, which
+# can run on a thread that already holds the lock
+_dump_refs_lock = threading.RLock()
+# Database -> the finalizer releasing its dump
+_dump_releases = weakref.WeakKeyDictionary()
+
 
 def _data_file(file_name: str) -> str:
     return os.path.join(str(data_manager.cog_data_path(raw_name='dadguide')), file_name)
 
 
-def load_database(existing_db):
+def _versioned_dump_file(dump_version: str) -> str:
+    return _data_file('dadguide_{}.sqlite'.format(dump_version[:16]))
+
+
+def diff_database(existing_db: DbContext):
+    """Compares the downloaded dump against the versioned copy existing_db was loaded from"""
+    DB_DUMP_FILE = _data_file('dadguide.sqlite')
+    if not existing_db or not os.path.exists(existing_db.database.data_file):
+        return None
+    return diff_databases(existing_db.database.data_file, DB_DUMP_FILE)
+
+
+def load_database(dump_version: str, graph=None, changed_monster_ids=None):
     DB_DUMP_FILE = _data_file('dadguide.sqlite')
-    DB_DUMP_WORKING_FILE = _data_file('dadguide_working.sqlite')
-    # Release the handle to the database file if it has one
-    if existing_db:
-        existing_db.close()
-    # Overwrite the working copy so we can open a handle to it without affecting future downloads
-    if os.path.exists(DB_DUMP_FILE):
-        shutil.copy2(DB_DUMP_FILE, DB_DUMP_WORKING_FILE)
-    # Open the new working copy.
-    database = DadguideDatabase(data_file=DB_DUMP_WORKING_FILE)
-    graph = MonsterGraph(database)
+    # The fetcher replaces the dump instead of writing into it, so a hard link pins the current
+    # contents without copying them. Published versions are opened immutable and never change.
+    versioned_file = _versioned_dump_file(dump_version)
+    with _dump_refs_lock:
+        if not os.path.exists(versioned_file):
+            try:
+                os.link(DB_DUMP_FILE, versioned_file)
+            except OSError:
+                # Filesystem without hard links
+                shutil.copyfile(DB_DUMP_FILE, versioned_file)
+        _dump_refs[versioned_file] += 1
+    database = DadguideDatabase(data_file=versioned_file)
+    # A replaced generation may still be used by whatever held on to it (an event, a menu, a
+    # lookup in progress), so its dump is only released once the database is garbage collected
+    release = weakref.finalize(database, _release_dump, versioned_file)
+    release.atexit = False
+    _dump_releases[database] = release
+    if graph is None:
+        graph = MonsterGraph(database)
+    elif changed_monster_ids is not None:
+        # Only reload the monsters that changed since graph was built
+        graph = MonsterGraph(database, base_graph=graph, changed_monster_ids=changed_monster_ids)
+    else:
+        # Prebuilt graph from a snapshot, it only needs a live connection
+        graph.database = database
     db_context = DbContext(database, graph)
     return db_context
+
+
+def unload_database(existing_db: DbContext):
+    """Closes a database right away instead of waiting for it to be garbage collected.
+
+    Only for databases nothing else can be using, like one that was never published.
+    """
+    existing_db.close()
+    release = _dump_releases.pop(existing_db.database, None)
+    if release:
+        release()
+
+
+def _release_dump(versioned_file: str):
+    """Drops a reference to a dump file, deleting it if no other database uses it"""
+    with _dump_refs_lock:
+        _dump_refs[versioned_file] -= 1
+        if _dump_refs[versioned_file] <= 0:
+            del _dump_refs[versioned_file]
+            _remove_unused_dumps()
+
+
+def _remove_unused_dumps():
+    # Also catches versions left behind by a previous run of the cog
+    for dump_file in glob.glob(_data_file('dadguide_*.sqlite')):
+        if dump_file not in _dump_refs:
+            try:
+                os.remove(dump_file)
+            except OSError:
+                pass
@@ -1,9 +1,16 @@
 import sqlite3 as lite
+import pathlib
+from operator import itemgetter
 
 import logging
 
 logger = logging.getLogger('red.padbot-cogs.dadguide.database_manager')
 
+# Dumps are never written to once they're opened, so the whole file can be mapped and shared
+# through the OS page cache instead of being read into sqlite's own cache
+MMAP_SIZE = 1 << 30
+CACHE_SIZE_KIB = 8 * 1024
+
 
 class DadguideTableNotFound(Exception):
     def __init__(self, table_name):
@@ -12,8 +19,17 @@ class DadguideTableNotFound(Exception):
 
 class DadguideDatabase(object):
     def __init__(self, data_file):
-        self._con = lite.connect(data_file, detect_types=lite.PARSE_DECLTYPES)
+        self.data_file = data_file
+        # Opened on the worker thread that builds a generation, then only used from the bot's loop.
+        # immutable skips all locking and change detection, which is only safe because the
+        # loader never modifies a dump file after it's been published under its version.
+        uri = pathlib.Path(data_file).resolve().as_uri() + '?mode=ro&immutable=1'
+        self._con = lite.connect(uri, uri=True, detect_types=lite.PARSE_DECLTYPES,
+                                 check_same_thread=False)
         self._con.row_factory = lite.Row
+        self._con.execute('PRAGMA mmap_size = {}'.format(MMAP_SIZE))
+        self._con.execute('PRAGMA cache_size = -{}'.format(CACHE_SIZE_KIB))
+        self._con.execute('PRAGMA temp_store = MEMORY')
 
     def __del__(self):
         self.close()
@@ -89,6 +105,20 @@ class DadguideDatabase(object):
             else:
                 return DictWithAttrAccess({res[idx_key]: DictWithAttrAccess(res) for res in cursor.fetchall()})
 
+    def query_rows(self, query, param=()):
+        """Streams the result of query as plain tuples.
+
+        Returns a column name -> index dict along with the cursor, for building ColumnMappings.
+        """
+        cursor = self._con.cursor()
+        cursor.row_factory = None
+        cursor.execute(query, param)
+        columns = {}
+        for idx, description in enumerate(cursor.description):
+            # Like sqlite3.Row, the first of several columns with the same name wins
+            columns.setdefault(description[0], idx)
+        return columns, cursor
+
     def get_table_fields(self, table_name: str):
         # SQL inject vulnerable :v
         table_info = self.query_many('PRAGMA table_info(' + table_name + ')', (), dict)
@@ -107,3 +137,20 @@ class DictWithAttrAccess(dict):
     def __init__(self, item):
         super(DictWithAttrAccess, self).__init__(item)
         self.__dict__ = self
+
+
+class ColumnMapping(object):
+    """Picks the kwargs of a model out of tuple rows from DadguideDatabase.query_rows.
+
+    fields are kwarg names, or (kwarg, column) pairs where the column is named differently.
+    """
+
+    def __init__(self, columns: dict, fields):
+        fields = [(f, f) if isinstance(f, str) else f for f in fields]
+        self.names = tuple(name for name, _ in fields)
+        indexes = [columns[column] for _, column in fields]
+        # itemgetter returns a bare value instead of a tuple when it only has one index
+        self._getter = itemgetter(*indexes) if len(indexes) > 1 else lambda row: (row[indexes[0]],)
+
+    def kwargs(self, row) -> dict:
+        return dict(zip(self.names, self._getter(row)))
@@ -0,0 +1,66 @@
+import gc
+import hashlib
+import logging
+import os
+import pickle
+from typing import Optional
+
+logger = logging.getLogger('red.padbot-cogs.dadguide.database_snapshot')
+
+# Bump this whenever the pickled layout of MonsterGraph or the monster indexes changes, so
+# that snapshots written by an older version of the cog are ignored instead of misread.
+SNAPSHOT_VERSION = 13
+
+
+def compute_snapshot_key(*content_hashes) -> Optional[str]:
+    """Combines the content hashes of every input file (plus the snapshot version) into one key."""
+    if None in content_hashes:
+        return None
+    sha = hashlib.sha256('v{}'.format(SNAPSHOT_VERSION).encode())
+    for content_hash in content_hashes:
+        sha.update(content_hash.encode())
+    return sha.hexdigest()
+
+
+def load_snapshot(snapshot_file, key):
+    """Returns the stored payload if the snapshot on disk was built from inputs matching key."""
+    if not os.path.exists(snapshot_file):
+        return None
+    try:
+        with open(snapshot_file, 'rb') as f:
+            # The key is pickled separately ahead of the payload so a stale snapshot can be
+            # rejected without unpickling the whole thing
+            if pickle.load(f) != key:
+                return None
+            # Unpickling allocates a huge number of small objects, pausing the cyclic GC while
+            # doing so cuts the load time by more than half
+            gc_was_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                return pickle.load(f)
+            finally:
+                if gc_was_enabled:
+                    gc.enable()
+    except Exception as ex:
+        logger.exception("failed to load dadguide snapshot: %s", ex)
+        return None
+
+
+def save_snapshot(snapshot_file, key, payload):
+    # Write to a temp file first so a crash mid-write never leaves a truncated snapshot
+    tmp_file = snapshot_file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        pickle.dump(key, f, pickle.HIGHEST_PROTOCOL)
+        pickle.dump(payload, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, snapshot_file)
+
+
+def restore_object(cls, state):
+    """Unpickles an instance without calling cls.__new__.
+
+    tsutils.aobject replaces __new__ with a coroutine, so the default pickle reconstruction
+    can't be used for the monster indexes.
+    """
+    obj = object.__new__(cls)
+    obj.__dict__.update(state)
+    return obj
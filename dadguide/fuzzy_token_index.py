@@ -0,0 +1,73 @@
+import bisect
+from typing import List
+
+import numpy as np
+
+# Characters counted separately by the signature; everything else shares the last column
+_ALPHABET = 'abcdefghijklmnopqrstuvwxyz0123456789'
+_COLUMNS = {c: i for i, c in enumerate(_ALPHABET)}
+_OTHER = len(_ALPHABET)
+
+# Jaro-Winkler only boosts a shared prefix of up to this many characters (some versions of
+# python-Levenshtein don't cap it, so longer shared prefixes are looked up separately)
+_WINKLER_PREFIX = 4
+# Rounding slack, so the bound never rejects a token that's exactly on the threshold
+_EPSILON = 1e-9
+
+
+def _signature(token: str):
+    counts = np.zeros(len(_ALPHABET) + 1, dtype=np.uint16)
+    for c in token:
+        counts[_COLUMNS.get(c, _OTHER)] += 1
+    return counts
+
+
+class FuzzyTokenIndex(object):
+    """Finds the tokens of a fixed list that might be close to a query token, without scoring all of them.
+
+    Tokens are returned in list order, duplicates included, so results line up exactly with a
+    scan over the list. The list is only narrowed down to candidates; callers still run the exact
+    metric on what comes back.
+    """
+
+    def __init__(self, tokens: List[str]):
+        self.tokens = list(tokens)
+        self.lengths = np.array([len(t) for t in self.tokens], dtype=np.float64)
+        self.signatures = np.array([_signature(t) for t in self.tokens], dtype=np.uint16) \
+            .reshape(len(self.tokens), len(_ALPHABET) + 1)
+        # Positions sorted by token, for prefix and membership lookups
+        self.sorted_positions = sorted(range(len(self.tokens)), key=lambda i: self.tokens[i])
+        self.sorted_tokens = [self.tokens[i] for i in self.sorted_positions]
+
+    def __contains__(self, token):
+        i = bisect.bisect_left(self.sorted_tokens, token)
+        return i < len(self.sorted_tokens) and self.sorted_tokens[i] == token
+
+    def prefixed(self, prefix: str) -> List[str]:
+        """Every token starting with prefix"""
+        return [self.tokens[i] for i in self._prefixed_positions(prefix)]
+
+    def jaro_winkler_candidates(self, token: str, min_similarity: float) -> List[str]:
+        """Every token whose Jaro-Winkler similarity (prefix weight .05) to token may exceed min_similarity.
+
+        Jaro similarity is at most (c/len1 + c/len2 + 1) / 3, where c is the number of characters the
+        two tokens have in common. With a shared prefix of up to 4 characters the Winkler boost adds
+        at most a fifth of what's left, which gives a minimum Jaro similarity for each token to clear.
+        Tokens sharing a longer prefix are always returned.
+        """
+        min_jaro = (min_similarity - _WINKLER_PREFIX * .05) / (1 - _WINKLER_PREFIX * .05)
+        if not token or min_jaro <= 0 or not self.tokens:
+            return list(self.tokens)
+        common = np.minimum(self.signatures, _signature(token)).sum(axis=1)
+        bound = common / len(token) + common / np.maximum(self.lengths, 1)
+        candidates = bound > 3 * min_jaro - 1 - _EPSILON
+        if len(token) > _WINKLER_PREFIX:
+            candidates[self._prefixed_positions(token[:_WINKLER_PREFIX + 1])] = True
+        return [self.tokens[i] for i in np.flatnonzero(candidates).tolist()]
+
+    def _prefixed_positions(self, prefix: str) -> List[int]:
+        start = bisect.bisect_left(self.sorted_tokens, prefix)
+        end = start
+        while end < len(self.sorted_tokens) and self.sorted_tokens[end].startswith(prefix):
+            end += 1
+        return sorted(self.sorted_positions[start:end])
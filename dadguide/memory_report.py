@@ -0,0 +1,43 @@
+import enum
+import gc
+import sys
+import types
+from collections import Counter
+
+# Shared by everything and owned by nothing, so they're left out of the totals
+_SKIPPED_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+                  types.MethodType, enum.Enum)
+
+
+def measure(roots) -> (int, Counter, Counter):
+    """Sums the size of every object reachable from roots, counting shared objects once.
+
+    Returns the total bytes along with the bytes and object count per type name.
+    """
+    seen = set()
+    bytes_by_type = Counter()
+    count_by_type = Counter()
+    pending = list(roots)
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or isinstance(obj, _SKIPPED_TYPES):
+            continue
+        seen.add(id(obj))
+        type_name = type(obj).__name__
+        bytes_by_type[type_name] += sys.getsizeof(obj)
+        count_by_type[type_name] += 1
+        pending.extend(gc.get_referents(obj))
+    return sum(bytes_by_type.values()), bytes_by_type, count_by_type
+
+
+def monster_memory_report(monsters: list, top: int = 12) -> str:
+    total, bytes_by_type, count_by_type = measure(monsters)
+    num_monsters = max(len(monsters), 1)
+    lines = ['{} monsters, {:,} bytes total, {:,.0f} bytes per monster'.format(
+        len(monsters), total, total / num_monsters),
+        '',
+        '{:<24}{:>10}{:>14}{:>12}'.format('type', 'objects', 'bytes', 'per monster')]
+    for type_name, type_bytes in bytes_by_type.most_common(top):
+        lines.append('{:<24}{:>10,}{:>14,}{:>12,.0f}'.format(
+            type_name, count_by_type[type_name], type_bytes, type_bytes / num_monsters))
+    return '\n'.join(lines)
@@ -2,6 +2,9 @@ from .base_model import BaseModel
 
 
 class ActiveSkillModel(BaseModel):
+    __slots__ = ('active_skill_id', 'name_ja', 'name_en', 'name_ko', 'desc_ja', 'desc_en', 'desc_ko',
+                 'turn_max', 'turn_min', 'search_fields')
+
     def __init__(self, **kwargs):
         self.active_skill_id = kwargs['active_skill_id']
         self.name_ja = kwargs['name_ja']
@@ -14,6 +17,8 @@ class ActiveSkillModel(BaseModel):
 
         self.turn_max = kwargs['turn_max']
         self.turn_min = kwargs['turn_min']
+        # Filled in by ActiveSkillSearchFields.for_skill
+        self.search_fields = None
 
     @property
     def desc(self):
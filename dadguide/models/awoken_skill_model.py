@@ -2,6 +2,9 @@ from .base_model import BaseModel
 
 
 class AwokenSkillModel(BaseModel):
+    __slots__ = ('awoken_skill_id', 'name_ja', 'name_en', 'name_ko', 'name', 'desc_ja', 'desc_en',
+                 'desc_ko', 'adj_hp', 'adj_atk', 'adj_rcv')
+
     def __init__(self, **kwargs):
         self.awoken_skill_id = kwargs['awoken_skill_id']
         self.name_ja = kwargs['name_ja']
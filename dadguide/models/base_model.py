@@ -2,6 +2,8 @@ import json
 
 
 class BaseModel(object):
+    # Models are created for every row of the database, so none of them get an instance __dict__
+    __slots__ = ()
 
     def to_dict(self):
         raise NotImplementedError
@@ -2,6 +2,9 @@ from .base_model import BaseModel
 
 
 class EvolutionModel(BaseModel):
+    __slots__ = ('evolution_type', 'from_id', 'to_id', 'mat_1_id', 'mat_2_id', 'mat_3_id', 'mat_4_id',
+                 'mat_5_id', 'mats', 'is_pixel', 'is_super_reincarnated', 'tstamp')
+
     def __init__(self, **kwargs):
         self.evolution_type = kwargs['evolution_type']
         self.from_id = kwargs['from_id']
@@ -2,6 +2,10 @@ from .base_model import BaseModel
 
 
 class LeaderSkillModel(BaseModel):
+    __slots__ = ('leader_skill_id', 'name_ja', 'name_en', 'name_ko', 'max_hp', 'max_atk', 'max_rcv',
+                 'max_shield', 'max_combos', 'bonus_damage', 'mult_bonus_damage', 'extra_time',
+                 'desc_en', 'desc_ja', 'desc_ko', 'search_text')
+
     def __init__(self, **kwargs):
         self.leader_skill_id = kwargs['leader_skill_id']
         self.name_ja = kwargs['name_ja']
@@ -18,6 +22,8 @@ class LeaderSkillModel(BaseModel):
         self.desc_en = kwargs['desc_en']
         self.desc_ja = kwargs['desc_ja']
         self.desc_ko = kwargs['desc_ko']
+        # Filled in by monster_model.leader_skill_search_text
+        self.search_text = None
 
     @property
     def data(self):
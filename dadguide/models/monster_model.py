@@ -14,6 +14,17 @@ from .monster_stats import monster_stats
 
 
 class MonsterModel(BaseModel):
+    __slots__ = ('monster_id', 'monster_no', 'monster_no_jp', 'monster_no_na', 'monster_no_kr',
+                 'awakenings', 'superawakening_count', 'leader_skill', 'leader_skill_id',
+                 'active_skill', 'active_skill_id', 'series', 'series_id', 'name_ja', 'name_ko',
+                 'name_en', 'roma_subname', 'name_en_override', 'type1', 'type2', 'type3', 'types',
+                 'rarity', 'is_farmable', 'in_rem', 'in_pem', 'in_mpshop', 'buy_mp', 'sell_gold',
+                 'sell_mp', 'reg_date', 'on_jp', 'on_na', 'on_kr', 'attr1', 'attr2', 'is_equip',
+                 'is_inheritable', 'evo_gem_id', 'orb_skin_id', 'cost', 'exp', 'fodder_exp', 'level',
+                 'limit_mult', 'latent_slots', 'hp_max', 'hp_min', 'hp_scale', 'atk_max', 'atk_min',
+                 'atk_scale', 'rcv_max', 'rcv_min', 'rcv_scale', 'voice_id_jp', 'voice_id_na',
+                 'pronunciation_ja', 'has_animation', 'has_hqimage', '_search')
+
     def __init__(self, **m):
         self.monster_id = m['monster_id']
         self.monster_no = self.monster_id
@@ -82,11 +93,6 @@ class MonsterModel(BaseModel):
         self.rcv_max = m['rcv_max']
         self.rcv_min = m['rcv_min']
         self.rcv_scale = m['rcv_scale']
-        self.stat_values = {
-            'hp': {'min': self.hp_min, 'max': self.hp_max, 'scale': self.hp_scale},
-            'atk': {'min': self.atk_min, 'max': self.atk_max, 'scale': self.atk_scale},
-            'rcv': {'min': self.rcv_min, 'max': self.rcv_max, 'scale': self.rcv_scale}
-        }
 
         self.voice_id_jp = m['voice_id_jp']
         self.voice_id_na = m['voice_id_na']
@@ -95,7 +101,22 @@ class MonsterModel(BaseModel):
         self.has_animation = m['has_animation']
         self.has_hqimage = m['has_hqimage']
 
-        self.search = MonsterSearchHelper(self)
+        # Only ^search reads this, so it's built the first time it's needed
+        self._search = None
+
+    @property
+    def search(self) -> 'MonsterSearchHelper':
+        if self._search is None:
+            self._search = MonsterSearchHelper(self)
+        return self._search
+
+    @property
+    def stat_values(self):
+        return {
+            'hp': {'min': self.hp_min, 'max': self.hp_max, 'scale': self.hp_scale},
+            'atk': {'min': self.atk_min, 'max': self.atk_max, 'scale': self.atk_scale},
+            'rcv': {'min': self.rcv_min, 'max': self.rcv_max, 'scale': self.rcv_scale}
+        }
 
     @property
     def killers(self):
@@ -170,14 +191,19 @@ class MonsterSearchHelper(object):
     def __init__(self, m: MonsterModel):
 
         self.name = '{} {}'.format(m.name_en, m.name_ja).lower()
-        leader_skill = m.leader_skill
-        self.leader = leader_skill.desc.lower() if leader_skill else ''
-        active_skill = m.active_skill
-        self.active_name = active_skill.name.lower() if active_skill else ''
-        self.active_desc = active_skill.desc.lower() if active_skill else ''
-        self.active = '{} {}'.format(self.active_name, self.active_desc)
-        self.active_min = active_skill.turn_min if active_skill else None
-        self.active_max = active_skill.turn_max if active_skill else None
+        self.leader = leader_skill_search_text(m.leader_skill)
+
+        # Everything parsed out of the active skill is shared by the monsters that have it
+        active = ActiveSkillSearchFields.for_skill(m.active_skill)
+        self.active_name = active.active_name
+        self.active_desc = active.active_desc
+        self.active = active.active
+        self.active_min = active.active_min
+        self.active_max = active.active_max
+        self.board_change = active.board_change
+        self.orb_convert = active.orb_convert
+        self.row_convert = active.row_convert
+        self.column_convert = active.column_convert
 
         self.color = [m.attr1.name.lower()]
         self.hascolor = [c.name.lower() for c in [m.attr1, m.attr2] if c]
@@ -186,19 +212,52 @@ class MonsterSearchHelper(object):
 
         self.types = [t.name for t in m.types]
 
-        def replace_colors(text: str):
-            return text.replace('red', 'fire').replace('blue', 'water').replace('green', 'wood')
 
-        self.leader = replace_colors(self.leader)
-        self.active = replace_colors(self.active)
-        self.active_name = replace_colors(self.active_name)
-        self.active_desc = replace_colors(self.active_desc)
+def _replace_colors(text: str):
+    return text.replace('red', 'fire').replace('blue', 'water').replace('green', 'wood')
+
+
+def leader_skill_search_text(leader_skill: LeaderSkillModel) -> str:
+    """The leader skill description as ^search matches it, cached on the skill."""
+    if leader_skill is None:
+        return ''
+    if leader_skill.search_text is None:
+        leader_skill.search_text = _replace_colors(leader_skill.desc.lower())
+    return leader_skill.search_text
+
+
+class ActiveSkillSearchFields(object):
+    """The parts of MonsterSearchHelper that only depend on the active skill.
+
+    Built once per ActiveSkillModel, and so once per skill for each loaded database. The
+    collections are shared between monsters and must not be modified.
+    """
+    __slots__ = ('active_name', 'active_desc', 'active', 'active_min', 'active_max',
+                 'board_change', 'orb_convert', 'row_convert', 'column_convert')
+
+    @classmethod
+    def for_skill(cls, active_skill: ActiveSkillModel) -> 'ActiveSkillSearchFields':
+        if active_skill is None:
+            return cls(None)
+        if active_skill.search_fields is None:
+            active_skill.search_fields = cls(active_skill)
+        return active_skill.search_fields
+
+    def __init__(self, active_skill: ActiveSkillModel):
+        self.active_name = active_skill.name.lower() if active_skill else ''
+        self.active_desc = active_skill.desc.lower() if active_skill else ''
+        self.active = '{} {}'.format(self.active_name, self.active_desc)
+        self.active_min = active_skill.turn_min if active_skill else None
+        self.active_max = active_skill.turn_max if active_skill else None
+
+        self.active = _replace_colors(self.active)
+        self.active_name = _replace_colors(self.active_name)
+        self.active_desc = _replace_colors(self.active_desc)
 
         self.board_change = []
-        self.orb_convert = defaultdict(list)
+        orb_convert = defaultdict(list)
         self.row_convert = []
         self.column_convert = []
-
         def color_txt_to_list(txt):
             txt = txt.replace('and', ' ')
             txt = txt.replace(',', ' ')
@@ -267,4 +326,7 @@ class MonsterSearchHelper(object):
                     dest_orbs = color_txt_to_list(sub_parts[1])
                     for so in source_orbs:
                         for do in dest_orbs:
-                            self.orb_convert[so].append(do)
+                            orb_convert[so].append(do)
+
+        # A plain dict, so looking up a missing color can't add it for every monster
+        self.orb_convert = dict(orb_convert)
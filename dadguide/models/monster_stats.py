@@ -1,5 +1,7 @@
 from typing import Literal
 
+import numpy as np
+
 StatType = Literal['hp', 'atk', 'rcv']
 
 
@@ -60,10 +62,10 @@ class MonsterStats:
         return int(round(s_val))
 
     def base_stat(self, key, lv, monster_model):
-        s_min = float(monster_model.stat_values[key]['min'])
-        s_max = float(monster_model.stat_values[key]['max'])
+        s_min = float(getattr(monster_model, key + '_min'))
+        s_max = float(getattr(monster_model, key + '_max'))
         if monster_model.level > 1:
-            scale = monster_model.stat_values[key]['scale']
+            scale = getattr(monster_model, key + '_scale')
             s_val = s_min + (s_max - s_min) * ((min(lv, monster_model.level) - 1) / (monster_model.level - 1)) ** scale
         else:
             s_val = s_min
@@ -94,4 +96,95 @@ class MonsterStats:
         return hp, atk, rcv, weighted
 
 
+class MonsterStatsTable(object):
+    """The stat columns of many monsters, so MonsterStats formulas can run on all of them at once.
+
+    Each method mirrors the MonsterStats method of the same name and returns one value per
+    monster, in the order the monsters were given.
+    """
+    STAT_KEYS = ('hp', 'atk', 'rcv')
+    INHERIT_DICT = {'hp': 0.10, 'atk': 0.05, 'rcv': 0.15}
+
+    def __init__(self, monsters):
+        monsters = list(monsters)
+        self.monster_ids = np.array([m.monster_id for m in monsters], dtype=np.int64)
+        self.columns = {}
+        for key in self.STAT_KEYS:
+            for column in ('min', 'max', 'scale'):
+                name = '{}_{}'.format(key, column)
+                self.columns[name] = np.array([getattr(m, name) or 0 for m in monsters], dtype=np.float64)
+        self.level = np.array([m.level for m in monsters], dtype=np.int64)
+        self.limit_mult = np.array([m.limit_mult or 0 for m in monsters], dtype=np.float64)
+        self.is_equip = np.array([m.is_equip for m in monsters], dtype=bool)
+        # Awakenings stats() counts when it isn't given a MonsterStatModifierInput
+        self.num_hp_awakening = np.array([m.awakening_count(1) for m in monsters], dtype=np.int64)
+        self.num_atk_awakening = np.array([m.awakening_count(2) for m in monsters], dtype=np.int64)
+        self.num_rcv_awakening = np.array([m.awakening_count(3) for m in monsters], dtype=np.int64)
+        self.num_voice_awakening = np.array([m.awakening_count(63) for m in monsters], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.monster_ids)
+
+    def base_stat(self, key: StatType, lv):
+        s_min = self.columns[key + '_min']
+        s_max = self.columns[key + '_max']
+        scale = self.columns[key + '_scale']
+        leveled = self.level > 1
+        # Level 1 monsters would divide by zero, their stat is just the min
+        progress = (np.minimum(lv, self.level) - 1) / np.where(leveled, self.level - 1, 1)
+        s_val = np.where(leveled, s_min + (s_max - s_min) * progress ** scale, s_min)
+        if lv > 99:
+            s_val = s_val * (1 + (self.limit_mult / 11 * (lv - 99)) / 100)
+        return s_val
+
+    def stat(self, key: StatType, lv, plus=99, inherit=False, is_plus_297=True,
+             stat_latents: MonsterStatModifierInput = None):
+        s_val = self.base_stat(key, lv)
+
+        if stat_latents and not inherit:
+            latents = s_val * stat_latents.get_latent_multiplier(key)
+            stat_awakenings = stat_latents.get_awakening_addition(key)
+            voice = s_val * stat_latents.num_voice_awakening * 0.1
+            s_val = np.where(self.is_equip, s_val, s_val + (latents + stat_awakenings + voice))
+
+        s_val = s_val + MonsterStats.PLUS_DICT[key] * max(min(plus, 99), 0)
+        if inherit:
+            if not is_plus_297:
+                s_val = s_val - MonsterStats.PLUS_DICT[key] * max(min(plus, 99), 0)
+            s_val = s_val * self.INHERIT_DICT[key]
+        # np.rint rounds halves to even, the same as round()
+        return np.rint(s_val).astype(np.int64)
+
+    def stats(self, lv=99, plus=0, inherit=False, stat_latents: MonsterStatModifierInput = None):
+        is_plus_297 = False
+        if plus == 297:
+            plus = (99, 99, 99)
+            is_plus_297 = True
+        elif plus == 0:
+            plus = (0, 0, 0)
+
+        if not stat_latents:
+            # The counts are per monster arrays, which the modifier math broadcasts over
+            stat_latents = MonsterStatModifierInput(
+                num_hp_awakening=self.num_hp_awakening,
+                num_atk_awakening=self.num_atk_awakening,
+                num_rcv_awakening=self.num_rcv_awakening,
+                num_voice_awakening=self.num_voice_awakening
+            )
+
+        hp = self.stat('hp', lv, plus[0], inherit, is_plus_297, stat_latents)
+        atk = self.stat('atk', lv, plus[1], inherit, is_plus_297, stat_latents)
+        rcv = self.stat('rcv', lv, plus[2], inherit, is_plus_297, stat_latents)
+        weighted = np.rint(hp / 10 + atk / 5 + rcv / 3).astype(np.int64)
+        return hp, atk, rcv, weighted
+
+    def monster_ids_with_stats(self, lv=99, hp=None, atk=None, rcv=None, weighted=None) -> set:
+        """Ids of the monsters whose stats at lv reach every given minimum."""
+        keep = np.ones(len(self), dtype=bool)
+        for minimum, values in zip((hp, atk, rcv, weighted), self.stats(lv=lv)):
+            if minimum:
+                keep &= values >= minimum
+        return set(self.monster_ids[keep].tolist())
+
+
 monster_stats = MonsterStats()
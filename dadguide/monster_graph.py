@@ -1,10 +1,9 @@
 import json
+from array import array
 from collections import defaultdict
-from typing import Optional
+from typing import List, Optional
 
-import networkx
-
-from .database_manager import DadguideDatabase
+from .database_manager import ColumnMapping, DadguideDatabase
 from .models.active_skill_model import ActiveSkillModel
 from .models.awakening_model import AwakeningModel
 from .models.awoken_skill_model import AwokenSkillModel
@@ -53,6 +52,7 @@ FROM
   LEFT OUTER JOIN monsters AS target_monsters ON monsters.name_ja || 'の希石' = target_monsters.name_ja
   LEFT OUTER JOIN exchanges ON target_monsters.monster_id = exchanges.target_monster_id
   LEFT OUTER JOIN drops ON monsters.monster_id = drops.monster_id
+{where}
 GROUP BY
   monsters.monster_id"""
 
@@ -83,7 +83,8 @@ AWAKENINGS_QUERY = """SELECT
   awoken_skills.*
 FROM
   awakenings
-  JOIN awoken_skills ON awakenings.awoken_skill_id = awoken_skills.awoken_skill_id"""
+  JOIN awoken_skills ON awakenings.awoken_skill_id = awoken_skills.awoken_skill_id
+{where}"""
 
 EGG_QUERY = """SELECT
    d_egg_machine_types.name AS type,
@@ -93,179 +94,353 @@ FROM
   JOIN d_egg_machine_types ON d_egg_machine_types.egg_machine_type_id = egg_machines.egg_machine_type_id
 """
 
+# Model kwargs and the query columns they're read from, see ColumnMapping
+LEADER_SKILL_FIELDS = (
+    'leader_skill_id', ('name_ja', 'ls_name_ja'), ('name_en', 'ls_name_en'),
+    ('name_ko', 'ls_name_ko'), ('desc_ja', 'ls_desc_ja'), ('desc_en', 'ls_desc_en'),
+    ('desc_ko', 'ls_desc_ko'), 'max_hp', 'max_atk', 'max_rcv', 'max_shield', 'max_combos',
+    'bonus_damage', 'mult_bonus_damage', 'extra_time')
+ACTIVE_SKILL_FIELDS = (
+    'active_skill_id', ('name_ja', 'as_name_ja'), ('name_en', 'as_name_en'),
+    ('name_ko', 'as_name_ko'), ('desc_ja', 'as_desc_ja'), ('desc_en', 'as_desc_en'),
+    ('desc_ko', 'as_desc_ko'), 'turn_max', 'turn_min')
+SERIES_FIELDS = (
+    'series_id', ('name_ja', 's_name_ja'), ('name_en', 's_name_en'), ('name_ko', 's_name_ko'),
+    ('series_type', 's_series_type'))
+MONSTER_FIELDS = (
+    'monster_id', 'monster_no_jp', 'monster_no_na', 'monster_no_kr', 'series_id',
+    'attribute_1_id', 'attribute_2_id', 'name_ja', 'name_en', 'name_ko', 'name_en_override',
+    'rarity', 'buy_mp', 'sell_mp', 'sell_gold', 'reg_date', 'on_jp', 'on_na', 'on_kr',
+    'type_1_id', 'type_2_id', 'type_3_id', ('is_inheritable', 'inheritable'), 'evo_gem_id',
+    'orb_skin_id', 'cost', 'level', 'exp', 'fodder_exp', 'limit_mult', 'pronunciation_ja',
+    'voice_id_jp', 'voice_id_na', 'hp_max', 'hp_min', 'hp_scale', 'atk_max', 'atk_min',
+    'atk_scale', 'rcv_max', 'rcv_min', 'rcv_scale', 'latent_slots', 'has_animation',
+    'has_hqimage')
+# MONSTER_FIELDS that are stored as 0/1 integers
+MONSTER_FLAGS = ('on_jp', 'on_na', 'on_kr', 'is_inheritable', 'has_animation', 'has_hqimage')
+AWOKEN_SKILL_FIELDS = (
+    'awoken_skill_id', 'name_ja', 'name_en', 'name_ko', 'desc_ja', 'desc_en', 'desc_ko',
+    'adj_hp', 'adj_atk', 'adj_rcv')
+AWAKENING_FIELDS = ('awakening_id', 'monster_id', 'awoken_skill_id', 'is_super', 'order_idx')
+EVOLUTION_FIELDS = (
+    'evolution_type', 'from_id', 'to_id', 'mat_1_id', 'mat_2_id', 'mat_3_id', 'mat_4_id',
+    'mat_5_id', 'tstamp')
+
+# Bits of MonsterGraph._alt_tree_flags, set when any monster in the tree has the property
+TREE_FARMABLE = 1
+TREE_MP = 2
+TREE_PEM = 4
+TREE_REM = 8
+
+EDGE_TYPES = ('evolution', 'back_evolution', 'transformation', 'back_transformation', 'material_of')
+
+
+class EdgeArrays(object):
+    """Compressed sparse row adjacency for a single edge type.
+
+    The monster ids reachable from row r are targets[offsets[r]:offsets[r + 1]]. If the edges
+    carry models, they're stored in a parallel list at the same positions.
+    """
+
+    def __init__(self, num_rows: int, edges: list, with_models: bool = False):
+        # Counting sort the (row, target, model) triples by their source row
+        offsets = [0] * (num_rows + 1)
+        for row, _, _ in edges:
+            offsets[row + 1] += 1
+        for row in range(num_rows):
+            offsets[row + 1] += offsets[row]
+
+        targets = [0] * len(edges)
+        models = [None] * len(edges) if with_models else None
+        next_pos = offsets[:-1]
+        for row, target, model in edges:
+            pos = next_pos[row]
+            next_pos[row] += 1
+            targets[pos] = target
+            if with_models:
+                models[pos] = model
+
+        self.offsets = array('i', offsets)
+        self.targets = array('i', targets)
+        self.models = models
+
+    def neighbors(self, row: int):
+        return self.targets[self.offsets[row]:self.offsets[row + 1]]
+
+    def edge_models(self, row: int):
+        return self.models[self.offsets[row]:self.offsets[row + 1]]
+
 
 class MonsterGraph(object):
-    def __init__(self, database: DadguideDatabase):
+    def __init__(self, database: DadguideDatabase, base_graph: 'MonsterGraph' = None,
+                 changed_monster_ids=()):
         self.database = database
-        self.graph = None
-        self.graph: networkx.MultiDiGraph
-        self.edges = None
-        self.nodes = None
+        # Monsters are stored by row; _row_by_id maps a monster_id to its row, or -1
+        self._monsters = []
+        self._row_by_id = array('i')
+        self._edges = {}
+        # Connected components over evolutions and transforms; _alt_tree_by_row maps a row to
+        # the index of its component's sorted tuple of monster ids in _alt_trees
+        self._alt_trees = []
+        self._alt_tree_by_row = array('i')
+        self._alt_tree_flags = bytearray()
+        # Derived per-row columns, filled in once the edges are known
+        self._evo_by_row = []
+        self._cur_evo_type_by_row = []
+        self._true_evo_type_by_row = []
+        self._is_transform_base_by_row = bytearray()
         self.max_monster_id = -1
-        self.build_graph()
+        if base_graph is None:
+            self.build_graph()
+        else:
+            self.patch_graph(base_graph, changed_monster_ids)
 
     def build_graph(self):
-        self.graph = networkx.MultiDiGraph()
-
-        ms = self.database.query_many(MONSTER_QUERY, ())
-        es = self.database.query_many(EVOS_QUERY, ())
-        aws = self.database.query_many(AWAKENINGS_QUERY, ())
-        ems = self.database.query_many(EGG_QUERY, ())
-
+        monsters = []
+        transforms = []
+        self._load_monsters('', '', monsters, transforms)
+        self._link_monsters(monsters, transforms)
+
+    def patch_graph(self, base_graph: 'MonsterGraph', changed_monster_ids):
+        """Builds this graph from base_graph, only reloading the monsters whose data changed.
+
+        Unchanged MonsterModels are shared with base_graph, which is left untouched.
+        """
+        changed_monster_ids = set(changed_monster_ids)
+        id_list = ','.join(str(int(mid)) for mid in changed_monster_ids) or 'NULL'
+
+        monsters = [m for m in base_graph._monsters if m.monster_id not in changed_monster_ids]
+        transforms = [(m.monster_id, linked_id) for m in monsters
+                      for linked_id in base_graph._get_edges(m.monster_id, 'transformation')]
+        self._load_monsters('WHERE monsters.monster_id IN ({})'.format(id_list),
+                            'WHERE awakenings.monster_id IN ({})'.format(id_list),
+                            monsters, transforms)
+        monsters.sort(key=lambda m: m.monster_id)
+        self._link_monsters(monsters, transforms)
+
+    def _load_monsters(self, monster_where: str, awakening_where: str, monsters: list,
+                       transforms: list):
+        # Models are built straight from tuple rows; sqlite3.Row and attribute dicts per row
+        # used to cost more than the models themselves
+        columns, aws = self.database.query_rows(AWAKENINGS_QUERY.format(where=awakening_where))
+        awoken_skill_fields = ColumnMapping(columns, AWOKEN_SKILL_FIELDS)
+        awakening_fields = ColumnMapping(columns, AWAKENING_FIELDS)
+        monster_id_idx = columns['monster_id']
+        awoken_skill_id_idx = columns['awoken_skill_id']
+        # Skills and series are shared by many monsters, so each one is only built once.
+        # Not reused across patches: a changed skill marks every monster using it as changed.
+        awoken_skills = {}
         mtoawo = defaultdict(list)
         for a in aws:
-            awoken_skill_model = AwokenSkillModel(**a)
-            awakening_model = AwakeningModel(awoken_skill_model=awoken_skill_model, **a)
-            mtoawo[a.monster_id].append(awakening_model)
-
+            awoken_skill_model = awoken_skills.get(a[awoken_skill_id_idx])
+            if awoken_skill_model is None:
+                awoken_skill_model = AwokenSkillModel(**awoken_skill_fields.kwargs(a))
+                awoken_skills[a[awoken_skill_id_idx]] = awoken_skill_model
+            awakening_model = AwakeningModel(awoken_skill_model=awoken_skill_model,
+                                             **awakening_fields.kwargs(a))
+            mtoawo[a[monster_id_idx]].append(awakening_model)
+
+        columns, ems = self.database.query_rows(EGG_QUERY)
+        type_idx, contents_idx = columns['type'], columns['contents']
         mtoegg = defaultdict(lambda: {'pem': False, 'rem': False})
         for e in ems:
-            data = json.loads(e.contents)
-            e_type = 'pem' if e.type == "PEM" else 'rem'
+            data = json.loads(e[contents_idx])
+            e_type = 'pem' if e[type_idx] == "PEM" else 'rem'
             for m in data:
                 idx = int(m[1:-1])  # Remove parentheses
                 mtoegg[idx][e_type] = True
 
+        columns, ms = self.database.query_rows(MONSTER_QUERY.format(where=monster_where))
+        ls_fields = ColumnMapping(columns, LEADER_SKILL_FIELDS)
+        as_fields = ColumnMapping(columns, ACTIVE_SKILL_FIELDS)
+        s_fields = ColumnMapping(columns, SERIES_FIELDS)
+        m_fields = ColumnMapping(columns, MONSTER_FIELDS)
+        ls_id_idx, as_id_idx = columns['leader_skill_id'], columns['active_skill_id']
+        s_id_idx = columns['series_id']
+        drop_id_idx, linked_id_idx = columns['drop_id'], columns['linked_monster_id']
+        leader_skills = {0: None}
+        active_skills = {0: None}
+        series = {}
         for m in ms:
-            ls_model = LeaderSkillModel(leader_skill_id=m.leader_skill_id,
-                                        name_ja=m.ls_name_ja,
-                                        name_en=m.ls_name_en,
-                                        name_ko=m.ls_name_ko,
-                                        desc_ja=m.ls_desc_ja,
-                                        desc_en=m.ls_desc_en,
-                                        desc_ko=m.ls_desc_ko,
-                                        max_hp=m.max_hp,
-                                        max_atk=m.max_atk,
-                                        max_rcv=m.max_rcv,
-                                        max_shield=m.max_shield,
-                                        max_combos=m.max_combos,
-                                        bonus_damage=m.bonus_damage,
-                                        mult_bonus_damage=m.mult_bonus_damage,
-                                        extra_time=m.extra_time,
-                                        ) if m.leader_skill_id != 0 else None
-
-            as_model = ActiveSkillModel(active_skill_id=m.active_skill_id,
-                                        name_ja=m.as_name_ja,
-                                        name_en=m.as_name_en,
-                                        name_ko=m.as_name_ko,
-                                        desc_ja=m.as_desc_ja,
-                                        desc_en=m.as_desc_en,
-                                        desc_ko=m.as_desc_ko,
-                                        turn_max=m.turn_max,
-                                        turn_min=m.turn_min
-                                        ) if m.active_skill_id != 0 else None
-
-            s_model = SeriesModel(series_id=m.series_id,
-                                  name_ja=m.s_name_ja,
-                                  name_en=m.s_name_en,
-                                  name_ko=m.s_name_ko,
-                                  series_type=m.s_series_type
-                                  )
-
-            m_model = MonsterModel(monster_id=m.monster_id,
-                                   monster_no_jp=m.monster_no_jp,
-                                   monster_no_na=m.monster_no_na,
-                                   monster_no_kr=m.monster_no_kr,
-                                   awakenings=mtoawo[m.monster_id],
+            ls_model = _interned(leader_skills, m[ls_id_idx], LeaderSkillModel, ls_fields, m)
+            as_model = _interned(active_skills, m[as_id_idx], ActiveSkillModel, as_fields, m)
+            s_model = _interned(series, m[s_id_idx], SeriesModel, s_fields, m)
+
+            m_kwargs = m_fields.kwargs(m)
+            for flag in MONSTER_FLAGS:
+                m_kwargs[flag] = m_kwargs[flag] == 1
+            monster_id = m_kwargs['monster_id']
+            m_model = MonsterModel(awakenings=mtoawo[monster_id],
                                    leader_skill=ls_model,
                                    active_skill=as_model,
                                    series=s_model,
-                                   series_id=m.series_id,
-                                   attribute_1_id=m.attribute_1_id,
-                                   attribute_2_id=m.attribute_2_id,
-                                   name_ja=m.name_ja,
-                                   name_en=m.name_en,
-                                   name_ko=m.name_ko,
-                                   name_en_override=m.name_en_override,
-                                   rarity=m.rarity,
-                                   is_farmable=m.drop_id is not None,
-                                   in_pem=mtoegg[m.monster_id]['pem'],
-                                   in_rem=mtoegg[m.monster_id]['rem'],
-                                   buy_mp=m.buy_mp,
-                                   sell_mp=m.sell_mp,
-                                   sell_gold=m.sell_gold,
-                                   reg_date=m.reg_date,
-                                   on_jp=m.on_jp == 1,
-                                   on_na=m.on_na == 1,
-                                   on_kr=m.on_kr == 1,
-                                   type_1_id=m.type_1_id,
-                                   type_2_id=m.type_2_id,
-                                   type_3_id=m.type_3_id,
-                                   is_inheritable=m.inheritable == 1,
-                                   evo_gem_id=m.evo_gem_id,
-                                   orb_skin_id=m.orb_skin_id,
-                                   cost=m.cost,
-                                   level=m.level,
-                                   exp=m.exp,
-                                   fodder_exp=m.fodder_exp,
-                                   limit_mult=m.limit_mult,
-                                   pronunciation_ja=m.pronunciation_ja,
-                                   voice_id_jp=m.voice_id_jp,
-                                   voice_id_na=m.voice_id_na,
-                                   hp_max=m.hp_max,
-                                   hp_min=m.hp_min,
-                                   hp_scale=m.hp_scale,
-                                   atk_max=m.atk_max,
-                                   atk_min=m.atk_min,
-                                   atk_scale=m.atk_scale,
-                                   rcv_max=m.rcv_max,
-                                   rcv_min=m.rcv_min,
-                                   rcv_scale=m.rcv_scale,
-                                   latent_slots=m.latent_slots,
-                                   has_animation=m.has_animation == 1,
-                                   has_hqimage=m.has_hqimage == 1,
-                                   )
-
-            self.graph.add_node(m.monster_id, model=m_model)
-            if m.linked_monster_id:
-                self.graph.add_edge(m.monster_id, m.linked_monster_id, type='transformation')
-                self.graph.add_edge(m.linked_monster_id, m.monster_id, type='back_transformation')
-
-            self.max_monster_id = max(self.max_monster_id, m.monster_id)
+                                   is_farmable=m[drop_id_idx] is not None,
+                                   in_pem=mtoegg[monster_id]['pem'],
+                                   in_rem=mtoegg[monster_id]['rem'],
+                                   **m_kwargs)
+
+            monsters.append(m_model)
+            if m[linked_id_idx]:
+                transforms.append((monster_id, m[linked_id_idx]))
+
+    def _link_monsters(self, monsters: list, transforms: list):
+        columns, es = self.database.query_rows(EVOS_QUERY)
+        evo_fields = ColumnMapping(columns, EVOLUTION_FIELDS)
+
+        self.max_monster_id = max((m.monster_id for m in monsters), default=-1)
+        self._monsters = monsters
+        self._row_by_id = array('i', [-1]) * (self.max_monster_id + 1)
+        for row, m_model in enumerate(monsters):
+            self._row_by_id[m_model.monster_id] = row
+
+        edges = {etype: [] for etype in EDGE_TYPES}
+
+        def add_edge(from_id, to_id, etype, model=None):
+            row = self._get_row(from_id)
+            if row != -1:
+                edges[etype].append((row, to_id, model))
+
+        for from_id, to_id in transforms:
+            add_edge(from_id, to_id, 'transformation')
+            add_edge(to_id, from_id, 'back_transformation')
 
         for e in es:
-            evo_model = EvolutionModel(**e)
+            evo_model = EvolutionModel(**evo_fields.kwargs(e))
 
-            self.graph.add_edge(
-                evo_model.from_id, evo_model.to_id, type='evolution', model=evo_model)
-            self.graph.add_edge(
-                evo_model.to_id, evo_model.from_id, type='back_evolution', model=evo_model)
+            add_edge(evo_model.from_id, evo_model.to_id, 'evolution')
+            add_edge(evo_model.to_id, evo_model.from_id, 'back_evolution', evo_model)
 
             # for material_of queries
             already_used_in_this_evo = []  # don't add same mat more than once per evo
             for mat in evo_model.mats:
                 if mat in already_used_in_this_evo:
                     continue
-                self.graph.add_edge(
-                    mat, evo_model.to_id, type="material_of", model=evo_model)
+                add_edge(mat, evo_model.to_id, 'material_of')
                 already_used_in_this_evo.append(mat)
 
-        # Caching
-        for mid in self.graph.nodes:
-            self.graph.nodes[mid]['alt_versions'] = self.process_alt_versions(mid)
-
-        self.edges = self.graph.edges
-        self.nodes = self.graph.nodes
-
-    @staticmethod
-    def _get_edges(node, etype):
-        return {mid for mid, atlas in node.items() for edge in atlas.values() if edge.get('type') == etype}
-
-    @staticmethod
-    def _get_edge_model(node, etype):
-        possible_results = set()
-        for atlas in node.values():
-            for edge in atlas.values():
-                if edge.get('type') == etype:
-                    possible_results.add(edge['model'])
+        # Only back_evolution edges are ever asked for their EvolutionModel
+        self._edges = {etype: EdgeArrays(len(monsters), etype_edges, etype == 'back_evolution')
+                       for etype, etype_edges in edges.items()}
+
+        self._build_alt_trees()
+        self._build_derived_columns()
+
+    def _build_alt_trees(self):
+        num_rows = len(self._monsters)
+        node_ids = [m.monster_id for m in self._monsters]
+        parent = list(range(num_rows))
+        # Edge targets that aren't monsters still belong to the tree, so they get nodes too
+        extra_nodes = {}
+
+        def get_node(monster_id):
+            row = self._get_row(monster_id)
+            if row != -1:
+                return row
+            if monster_id not in extra_nodes:
+                extra_nodes[monster_id] = len(parent)
+                parent.append(len(parent))
+                node_ids.append(monster_id)
+            return extra_nodes[monster_id]
+
+        def find(node):
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+
+        for etype in ('evolution', 'back_evolution', 'transformation', 'back_transformation'):
+            edges = self._edges[etype]
+            for row in range(num_rows):
+                for target in edges.neighbors(row):
+                    root_a, root_b = find(row), find(get_node(target))
+                    if root_a != root_b:
+                        parent[root_a] = root_b
+
+        tree_by_root = {}
+        self._alt_trees = []
+        self._alt_tree_by_row = array('i', [0]) * num_rows
+        members = defaultdict(list)
+        for node, monster_id in enumerate(node_ids):
+            members[find(node)].append(monster_id)
+        for row in range(num_rows):
+            root = find(row)
+            if root not in tree_by_root:
+                tree_by_root[root] = len(self._alt_trees)
+                self._alt_trees.append(tuple(sorted(members[root])))
+            self._alt_tree_by_row[row] = tree_by_root[root]
+
+        self._alt_tree_flags = bytearray(len(self._alt_trees))
+        for row, m in enumerate(self._monsters):
+            flags = ((TREE_FARMABLE if m.is_farmable else 0) | (TREE_MP if m.in_mpshop else 0)
+                     | (TREE_PEM if m.in_pem else 0) | (TREE_REM if m.in_rem else 0))
+            self._alt_tree_flags[self._alt_tree_by_row[row]] |= flags
+
+    def _build_derived_columns(self):
+        # Order matters: true evo type reads the evo and cur evo type columns
+        self._evo_by_row = [self._compute_evo(row) for row in range(len(self._monsters))]
+        self._cur_evo_type_by_row = [EvoType(evo.evolution_type) if evo else EvoType.Base
+                                     for evo in self._evo_by_row]
+        self._true_evo_type_by_row = [self._compute_true_evo_type(m) for m in self._monsters]
+        self._is_transform_base_by_row = bytearray(
+            self.get_transform_base_id_by_id(m.monster_id) == m.monster_id for m in self._monsters)
+
+    def _compute_evo(self, row):
+        possible_results = self._edges['back_evolution'].edge_models(row)
         if len(possible_results) == 0:
             return None
         return sorted(possible_results, key=lambda x: x.tstamp)[-1]
 
+    def _compute_true_evo_type(self, monster: MonsterModel) -> InternalEvoType:
+        monster_id = monster.monster_id
+        if self.get_base_id_by_id(monster_id) == monster_id:
+            return InternalEvoType.Base
+
+        evo = self.get_evo_by_monster_id(monster_id)
+        if evo is None:
+            # this is possible without being the above case for transforms
+            return InternalEvoType.Base
+        if evo.is_super_reincarnated:
+            return InternalEvoType.SuperReincarnated
+        elif evo.is_pixel:
+            return InternalEvoType.Pixel
+
+        if monster.is_equip:
+            return InternalEvoType.Assist
+
+        cur_evo_type = self.cur_evo_type_by_monster_id(monster_id)
+        if cur_evo_type == EvoType.UuvoReincarnated:
+            return InternalEvoType.Reincarnated
+        elif cur_evo_type == EvoType.UvoAwoken:
+            return InternalEvoType.Ultimate
+
+        return InternalEvoType.Normal
+
+    def __getstate__(self):
+        # The sqlite connection can't be pickled; load_database reattaches a fresh one
+        state = self.__dict__.copy()
+        state['database'] = None
+        return state
+
+    def _get_row(self, monster_id) -> int:
+        if monster_id is None or not 0 <= monster_id < len(self._row_by_id):
+            return -1
+        return self._row_by_id[monster_id]
+
+    def _get_edges(self, monster_id, etype):
+        row = self._get_row(monster_id)
+        if row == -1:
+            return set()
+        return set(self._edges[etype].neighbors(row))
+
+    def get_all_monsters(self) -> List[MonsterModel]:
+        """Every monster in the graph, ordered by monster_id. Don't modify the list."""
+        return self._monsters
+
     def get_monster(self, monster_id) -> Optional[MonsterModel]:
-        if monster_id not in self.graph.nodes:
+        row = self._get_row(monster_id)
+        if row == -1:
             return None
-        return self.graph.nodes[monster_id]['model']
+        return self._monsters[row]
 
     def get_evo_tree(self, monster_id):
         ids = set()
@@ -274,9 +449,8 @@ class MonsterGraph(object):
             mid = to_check.pop()
             if mid in ids:
                 continue
-            n = self.graph[mid]
-            to_check.update(self._get_edges(n, 'evolution'))
-            to_check.update(self._get_edges(n, 'back_evolution'))
+            to_check.update(self._get_edges(mid, 'evolution'))
+            to_check.update(self._get_edges(mid, 'back_evolution'))
             ids.add(mid)
         return ids
 
@@ -287,29 +461,23 @@ class MonsterGraph(object):
             mid = to_check.pop()
             if mid in ids:
                 continue
-            n = self.graph[mid]
-            to_check.update(self._get_edges(n, 'transformation'))
-            to_check.update(self._get_edges(n, 'back_transformation'))
-            ids.add(mid)
-        return ids
-
-    def process_alt_versions(self, monster_id):
-        ids = set()
-        to_check = {monster_id}
-        while to_check:
-            mid = to_check.pop()
-            if mid in ids:
-                continue
-            n = self.graph[mid]
-            to_check.update(self._get_edges(n, 'evolution'))
-            to_check.update(self._get_edges(n, 'transformation'))
-            to_check.update(self._get_edges(n, 'back_evolution'))
-            to_check.update(self._get_edges(n, 'back_transformation'))
+            to_check.update(self._get_edges(mid, 'transformation'))
+            to_check.update(self._get_edges(mid, 'back_transformation'))
             ids.add(mid)
         return ids
 
     def get_alt_ids_by_id(self, monster_id):
-        return self.nodes[monster_id]['alt_versions']
+        """Returns the sorted ids of every monster in the same evo/transform tree"""
+        row = self._get_row(monster_id)
+        if row == -1:
+            return None
+        return self._alt_trees[self._alt_tree_by_row[row]]
+
+    def _alt_tree_has_flag(self, monster_id, flag) -> bool:
+        row = self._get_row(monster_id)
+        if row == -1:
+            return False
+        return bool(self._alt_tree_flags[self._alt_tree_by_row[row]] & flag)
 
     def get_alt_monsters_by_id(self, monster_id):
         ids = self.get_alt_ids_by_id(monster_id)
@@ -322,7 +490,7 @@ class MonsterGraph(object):
         alt_cards = self.get_alt_ids_by_id(monster_id)
         if alt_cards is None:
             return None
-        return sorted(alt_cards)[0]
+        return alt_cards[0]
 
     def get_base_id(self, monster):
         return self.get_base_id_by_id(monster.monster_id)
@@ -361,7 +529,10 @@ class MonsterGraph(object):
         return self.get_monster(self.get_transform_base_id_by_id(monster_id))
 
     def monster_is_transform_base_by_id(self, monster_id: int) -> bool:
-        return self.get_transform_base_id_by_id(monster_id) == monster_id
+        row = self._get_row(monster_id)
+        if row == -1:
+            return True
+        return bool(self._is_transform_base_by_row[row])
 
     def monster_is_transform_base(self, monster: MonsterModel) -> bool:
         return self.monster_is_transform_base_by_id(monster.monster_no)
@@ -370,51 +541,37 @@ class MonsterGraph(object):
         alt_cards = self.get_alt_ids_by_id(monster_id)
         if alt_cards is None:
             return None
-        return sorted(alt_cards)[-1]
+        return alt_cards[-1]
 
     def get_numerical_sort_top_monster_by_id(self, monster_id):
         return self.get_monster(self.get_numerical_sort_top_id_by_id(monster_id))
 
     def get_evo_by_monster_id(self, monster_id) -> Optional[EvolutionModel]:
-        return self._get_edge_model(self.graph[monster_id], 'back_evolution')
+        row = self._get_row(monster_id)
+        if row == -1:
+            return None
+        return self._evo_by_row[row]
 
     def cur_evo_type_by_monster_id(self, monster_id: int) -> EvoType:
-        prev_evo = self.get_evo_by_monster_id(monster_id)
-        return EvoType(prev_evo.evolution_type) if prev_evo else EvoType.Base
+        row = self._get_row(monster_id)
+        if row == -1:
+            return EvoType.Base
+        return self._cur_evo_type_by_row[row]
 
     def cur_evo_type_by_monster(self, monster: MonsterModel) -> EvoType:
         return self.cur_evo_type_by_monster_id(monster.monster_no)
 
     def true_evo_type_by_monster_id(self, monster_id: int) -> InternalEvoType:
-        if self.get_base_id_by_id(monster_id) == monster_id:
-            return InternalEvoType.Base
-
-        evo = self.get_evo_by_monster_id(monster_id)
-        if evo is None:
-            # this is possible without being the above case for transforms
+        row = self._get_row(monster_id)
+        if row == -1:
             return InternalEvoType.Base
-        if evo.is_super_reincarnated:
-            return InternalEvoType.SuperReincarnated
-        elif evo.is_pixel:
-            return InternalEvoType.Pixel
-
-        monster = self.get_monster(monster_id)
-        if monster.is_equip:
-            return InternalEvoType.Assist
-
-        cur_evo_type = self.cur_evo_type_by_monster_id(monster_id)
-        if cur_evo_type == EvoType.UuvoReincarnated:
-            return InternalEvoType.Reincarnated
-        elif cur_evo_type == EvoType.UvoAwoken:
-            return InternalEvoType.Ultimate
-
-        return InternalEvoType.Normal
+        return self._true_evo_type_by_row[row]
 
     def true_evo_type_by_monster(self, monster: MonsterModel) -> InternalEvoType:
         return self.true_evo_type_by_monster_id(monster.monster_no)
 
     def get_prev_evolution_by_monster_id(self, monster_id):
-        bes = self._get_edges(self.graph[monster_id], 'back_evolution')
+        bes = self._get_edges(monster_id, 'back_evolution')
         if bes:
             return bes.pop()
         return None
@@ -423,19 +580,19 @@ class MonsterGraph(object):
         return self.get_prev_evolution_by_monster_id(monster.monster_no)
 
     def get_next_evolutions_by_monster_id(self, monster_id):
-        return self._get_edges(self.graph[monster_id], 'evolution')
+        return self._get_edges(monster_id, 'evolution')
 
     def get_next_evolutions_by_monster(self, monster: MonsterModel):
         return self.get_next_evolutions_by_monster_id(monster.monster_no)
 
     def get_prev_transforms_by_monster_id(self, monster_id):
-        return self._get_edges(self.graph[monster_id], 'back_transformation')
+        return self._get_edges(monster_id, 'back_transformation')
 
     def get_prev_transforms_by_monster(self, monster: MonsterModel):
         return self.get_prev_evolution_by_monster_id(monster.monster_no)
 
     def get_next_transform_by_monster_id(self, monster_id):
-        bes = self._get_edges(self.graph[monster_id], 'transformation')
+        bes = self._get_edges(monster_id, 'transformation')
         if bes:
             return bes.pop()
         return None
@@ -454,56 +611,52 @@ class MonsterGraph(object):
 
     # farmable
     def monster_is_farmable_by_id(self, monster_id):
-        return self.graph.nodes[monster_id]['model'].is_farmable
+        return self.get_monster(monster_id).is_farmable
 
     def monster_is_farmable(self, monster: MonsterModel):
         return self.monster_is_farmable_by_id(monster.monster_no)
 
     def monster_is_farmable_evo_by_id(self, monster_id):
-        return any(
-            m for m in self.get_alt_ids_by_id(monster_id) if self.monster_is_farmable_by_id(m))
+        return self._alt_tree_has_flag(monster_id, TREE_FARMABLE)
 
     def monster_is_farmable_evo(self, monster: MonsterModel):
         return self.monster_is_farmable_evo_by_id(monster.monster_no)
 
     # mp
     def monster_is_mp_by_id(self, monster_id):
-        return self.graph.nodes[monster_id]['model'].in_mpshop
+        return self.get_monster(monster_id).in_mpshop
 
     def monster_is_mp(self, monster: MonsterModel):
         return self.monster_is_mp_by_id(monster.monster_no)
 
     def monster_is_mp_evo_by_id(self, monster_id):
-        return any(
-            m for m in self.get_alt_ids_by_id(monster_id) if self.monster_is_mp_by_id(m))
+        return self._alt_tree_has_flag(monster_id, TREE_MP)
 
     def monster_is_mp_evo(self, monster: MonsterModel):
         return self.monster_is_mp_evo_by_id(monster.monster_no)
 
     # pem
     def monster_is_pem_by_id(self, monster_id):
-        return self.graph.nodes[monster_id]['model'].in_pem
+        return self.get_monster(monster_id).in_pem
 
     def monster_is_pem(self, monster: MonsterModel):
         return self.monster_is_pem_by_id(monster.monster_no)
 
     def monster_is_pem_evo_by_id(self, monster_id):
-        return any(
-            m for m in self.get_alt_ids_by_id(monster_id) if self.monster_is_pem_by_id(m))
+        return self._alt_tree_has_flag(monster_id, TREE_PEM)
 
     def monster_is_pem_evo(self, monster: MonsterModel):
         return self.monster_is_pem_evo_by_id(monster.monster_no)
 
     # rem
     def monster_is_rem_by_id(self, monster_id):
-        return self.graph.nodes[monster_id]['model'].in_rem
+        return self.get_monster(monster_id).in_rem
 
     def monster_is_rem(self, monster: MonsterModel):
         return self.monster_is_rem_by_id(monster.monster_no)
 
     def monster_is_rem_evo_by_id(self, monster_id):
-        return any(
-            m for m in self.get_alt_ids_by_id(monster_id) if self.monster_is_rem_by_id(m))
+        return self._alt_tree_has_flag(monster_id, TREE_REM)
 
     def monster_is_rem_evo(self, monster: MonsterModel):
         return self.monster_is_rem_evo_by_id(monster.monster_no)
@@ -550,7 +703,13 @@ class MonsterGraph(object):
         return self.evo_gem_monster_by_id(monster.monster_no)
 
     def material_of_ids_by_id(self, monster_id: int) -> list:
-        return sorted(self._get_edges(self.graph[monster_id], 'material_of'))
+        return sorted(self._get_edges(monster_id, 'material_of'))
 
     def material_of_ids(self, monster: MonsterModel) -> list:
         return self.material_of_ids_by_id(monster.monster_no)
+
+
+def _interned(models: dict, model_id, model_class, fields: ColumnMapping, row):
+    if model_id not in models:
+        models[model_id] = model_class(**fields.kwargs(row))
+    return models[model_id]
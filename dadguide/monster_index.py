@@ -1,12 +1,13 @@
-import csv
-import io
 import re
 from collections import defaultdict
 
-import aiohttp
 from redbot.core.utils import AsyncIter
 from tsutils import aobject
 
+from .content_fetcher import ContentFetcher
+from .database_snapshot import restore_object
+from .fuzzy_token_index import FuzzyTokenIndex
+from .multi_word_trie import MultiWordTrie
 from .token_mappings import *
 
 SHEETS_PATTERN = 'https://docs.google.com/spreadsheets/d/1EoZJ3w5xsXZ67kmarLE4vfrZSIIIAfj04HXeZVST3eY' \
@@ -16,9 +17,20 @@ GROUP_TREENAMES_OVERRIDES_SHEET = SHEETS_PATTERN.format('2070615818')
 PANTHNAME_OVERRIDES_SHEET = SHEETS_PATTERN.format('959933643')
 NAME_TOKEN_ALIAS_SHEET = SHEETS_PATTERN.format('1229125459')
 
+SERIES_TYPE_PRIORITY = {
+    "regular": 4,
+    "event": 4,
+    "seasonal": 3,
+    "ghcollab": 2,
+    "collab": 1,
+    None: 0
+}
+# Types that don't count towards a monster's typing when ranking id3 matches
+GENERIC_TYPE_VALUES = (0, 12, 14, 15)
+
 
 class MonsterIndex2(aobject):
-    async def __ainit__(self, monsters, db):
+    async def __ainit__(self, monsters, db, fetcher: ContentFetcher):
         self.graph = db.graph
 
         self.monster_id_to_nickname = defaultdict(set)
@@ -35,7 +47,7 @@ class MonsterIndex2(aobject):
 
         self.replacement_tokens = defaultdict(set)
 
-        nickname_data = await sheet_to_reader(NICKNAME_OVERRIDES_SHEET)
+        nickname_data = fetcher.csv_reader(NICKNAME_OVERRIDES_SHEET)
         for m_id, name, *data in nickname_data:
             lp, i, *_ = data + [None, None]
             if m_id.isdigit() and not i:
@@ -46,7 +58,7 @@ class MonsterIndex2(aobject):
                         self.multi_word_tokens.add(tuple(name.lower().split(" ")))
                     self.monster_id_to_nickname[int(m_id)].add(name.lower().replace(" ", ""))
 
-        treenames_data = await sheet_to_reader(GROUP_TREENAMES_OVERRIDES_SHEET)
+        treenames_data = fetcher.csv_reader(GROUP_TREENAMES_OVERRIDES_SHEET)
         for m_id, name, *data in treenames_data:
             _, i, *_ = data + [None, None]
             if m_id.isdigit() and not i:
@@ -54,95 +66,179 @@ class MonsterIndex2(aobject):
                     self.multi_word_tokens.add(tuple(name.lower().split(" ")))
                 self.monster_id_to_treename[int(m_id)].add(name.lower().replace(" ", ""))
 
-        pantheon_data = await sheet_to_reader(PANTHNAME_OVERRIDES_SHEET)
+        pantheon_data = fetcher.csv_reader(PANTHNAME_OVERRIDES_SHEET)
         for sid, name, *_ in pantheon_data:
             if sid.isdigit():
                 if " " in name:
                     self.multi_word_tokens.add(tuple(name.lower().split(" ")))
                 self.series_id_to_pantheon_nickname[int(sid)].add(name.lower().replace(" ", ""))
 
-        nt_alias_data = await sheet_to_reader(NAME_TOKEN_ALIAS_SHEET)
+        nt_alias_data = fetcher.csv_reader(NAME_TOKEN_ALIAS_SHEET)
         next(nt_alias_data)  # Skip over heading
         for token, alias, *_ in nt_alias_data:
             self.replacement_tokens[token].add(alias)
 
+        self.multi_word_trie = MultiWordTrie(self.multi_word_tokens)
         self.manual = self.name_tokens = self.fluff_tokens = self.modifiers = defaultdict(set)
         await self._build_monster_index(monsters)
-        self.manual = combine_tokens(self.manual_nick, self.manual_tree)
-        self.all_name_tokens = list(self.manual) + list(self.fluff_tokens) + list(self.name_tokens)
-        self.all_modifiers = {p for ps in self.modifiers.values() for p in ps}
+        self._combine_tokens()
         self.suffixes = LEGAL_END_TOKENS
 
     __init__ = __ainit__
 
+    def __reduce__(self):
+        return restore_object, (self.__class__, self.__dict__.copy())
+
+    async def patched(self, db, monster_ids):
+        """Returns a copy of this index with the tokens of monster_ids rebuilt from db.
+
+        monster_ids must be closed over alt trees, since tokens are shared within a tree.
+        """
+        index = restore_object(self.__class__, self.__dict__.copy())
+        index.graph = db.graph
+        index.ordinals = self.ordinals.copy()
+        index.ordinals.remove(monster_ids)
+        removed_bits = self.ordinals.mask(monster_ids)
+        index.manual_nick = self.manual_nick.without(removed_bits, index.ordinals)
+        index.manual_tree = self.manual_tree.without(removed_bits, index.ordinals)
+        index.name_tokens = self.name_tokens.without(removed_bits, index.ordinals)
+        index.fluff_tokens = self.fluff_tokens.without(removed_bits, index.ordinals)
+        index.modifiers = defaultdict(set, {m: mods for m, mods in self.modifiers.items()
+                                            if m.monster_id not in monster_ids})
+        index.modifier_postings = self.modifier_postings.without(removed_bits, index.ordinals)
+
+        mod_maps = index._get_mod_maps()
+        monsters = [db.graph.get_monster(mid) for mid in sorted(monster_ids)]
+        async for m in AsyncIter(m for m in monsters if m is not None):
+            await index._index_monster(m, mod_maps)
+        index._combine_tokens()
+        return index
+
+    def _combine_tokens(self):
+        self.manual = self.manual_nick.union(self.manual_tree)
+        self.all_name_tokens = list(self.manual) + list(self.fluff_tokens) + list(self.name_tokens)
+        self.name_token_index = FuzzyTokenIndex(self.all_name_tokens)
+        self.all_modifiers = set(self.modifier_postings)
+        self.long_modifiers = [p for p in self.all_modifiers if len(p) > 8]
+        # Alt tree (as returned by the graph) -> bitset of its monsters, for evo expansion
+        self.tree_bits = defaultdict(int)
+        for m in self.ordinals.decode(self.ordinals.all_bits):
+            self.tree_bits[self.graph.get_alt_ids_by_id(m.monster_id)] |= self.ordinals.bit(m)
+        self._build_ranking_keys()
+
+    def _build_ranking_keys(self):
+        """Packs the query independent tie breakers of id3 into one int per monster id.
+
+        Fields go from most to least significant, each as wide as its range needs, so comparing
+        the ints compares the fields in order. The bit na_id_overlap_bit is left clear for id3 to
+        set on NA monsters when the query has a 4 digit number in it.
+        """
+        monsters = list(self.ordinals.decode(self.ordinals.all_bits))
+        na_id_overlap_field = 1
+        rows = [(not m.is_equip,
+                 False,
+                 SERIES_TYPE_PRIORITY.get(m.series.series_type, -1),
+                 m.on_na if m.series.series_type == "collab" else 0,
+                 self.graph.monster_is_rem_evo(m),
+                 not all(t.value in GENERIC_TYPE_VALUES for t in m.types),
+                 not any(t.value in GENERIC_TYPE_VALUES for t in m.types),
+                 -self.graph.get_base_id(m),
+                 m.rarity,
+                 m.monster_no_na) for m in monsters]
+        keys = [0] * len(rows)
+        shift = 0
+        self.na_id_overlap_bit = 1
+        for field in reversed(range(len(rows[0]) if rows else 0)):
+            values = [int(row[field]) for row in rows]
+            low = min(values)
+            for i, value in enumerate(values):
+                keys[i] |= (value - low) << shift
+            if field == na_id_overlap_field:
+                self.na_id_overlap_bit = 1 << shift
+                shift += 1
+            else:
+                shift += (max(values) - low).bit_length()
+        self.ranking_keys = {m.monster_id: key for m, key in zip(monsters, keys)}
+
+    def _get_mod_maps(self):
+        return list(MODIFIER_MAPS.values()) + list(self.series_id_to_pantheon_nickname.values())
+
     async def _build_monster_index(self, monsters):
-        self.manual_nick = defaultdict(set)
-        self.manual_tree = defaultdict(set)
-        self.name_tokens = defaultdict(set)
-        self.fluff_tokens = defaultdict(set)
+        self.ordinals = MonsterOrdinals()
+        self.manual_nick = MonsterPostings(self.ordinals)
+        self.manual_tree = MonsterPostings(self.ordinals)
+        self.name_tokens = MonsterPostings(self.ordinals)
+        self.fluff_tokens = MonsterPostings(self.ordinals)
         self.modifiers = defaultdict(set)
+        self.modifier_postings = MonsterPostings(self.ordinals)
 
-        mod_maps = list(MODIFIER_MAPS.values()) + list(self.series_id_to_pantheon_nickname.values())
+        mod_maps = self._get_mod_maps()
 
         async for m in AsyncIter(monsters):
-            self.modifiers[m] = await self.get_modifiers(m)
-
-            # ID
-            self.name_tokens[str(m.monster_id)].add(m)
-            self.name_tokens[str(m.monster_id % 10000)].add(m)
-
-            # Name and Fluff Tokens
-            manual = False
-            nametokens = self._name_to_tokens(m.name_en)
-            for me in self.graph.get_alt_ids_by_id(m.monster_id):
-                for t in self.monster_id_to_nametokens[me]:
-                    if t in nametokens:
-                        self.name_tokens[t].add(m)
-            if not manual:
-                for token in self._get_important_tokens(m.name_en) + self._name_to_tokens(m.roma_subname):
-                    self.name_tokens[token.lower()].add(m)
-                    for repl in self.replacement_tokens[token.lower()]:
-                        self.name_tokens[repl].add(m)
-                    if m.is_equip:
-                        ts = re.findall(r"(\w+)'s", m.name_en.lower())
-                        for me in self.graph.get_alt_monsters(m):
-                            for t2 in ts:
-                                if t2 in me.name_en.lower():
-                                    self.name_tokens[t2].add(me)
-                    else:
-                        for me in self.graph.get_alt_monsters(m):
-                            if token in self._name_to_tokens(me.name_en):
-                                self.name_tokens[token].add(me)
-                                for repl in self.replacement_tokens[token.lower()]:
-                                    self.name_tokens[repl].add(me)
-                    if token not in HAZARDOUS_IN_NAME_PREFIXES:
-                        for pas in mod_maps:
-                            if token in pas:
-                                self.modifiers[m].update(pas)
-            for token in nametokens:
-                if m in self.name_tokens[token.lower()]:
-                    continue
-                self.fluff_tokens[token.lower()].add(m)
+            await self._index_monster(m, mod_maps)
+
+    async def _index_monster(self, m, mod_maps):
+        self.modifiers[m] = await self.get_modifiers(m)
+
+        # ID
+        self.name_tokens.add(str(m.monster_id), m)
+        self.name_tokens.add(str(m.monster_id % 10000), m)
+
+        # Name and Fluff Tokens
+        manual = False
+        nametokens = self._name_to_tokens(m.name_en)
+        for me in self.graph.get_alt_ids_by_id(m.monster_id):
+            for t in self.monster_id_to_nametokens[me]:
+                if t in nametokens:
+                    self.name_tokens.add(t, m)
+        if not manual:
+            for token in self._get_important_tokens(m.name_en) + self._name_to_tokens(m.roma_subname):
+                self.name_tokens.add(token.lower(), m)
                 for repl in self.replacement_tokens[token.lower()]:
-                    self.fluff_tokens[repl].add(m)
-                for pas in mod_maps:
-                    if token in pas:
-                        self.modifiers[m].update(pas)
-
-            # Monster Nickname
-            for nick in self.monster_id_to_nickname[m.monster_id]:
-                self.manual_nick[nick].add(m)
-                for pas in mod_maps:
-                    if nick in pas:
-                        self.modifiers[m].update(pas)
-
-            # Tree Nickname
-            base_id = self.graph.get_base_id(m)
-            for nick in self.monster_id_to_treename[base_id]:
-                self.manual_tree[nick].add(m)
-                for pas in mod_maps:
-                    if nick in pas:
-                        self.modifiers[m].update(pas)
+                    self.name_tokens.add(repl, m)
+                if m.is_equip:
+                    ts = re.findall(r"(\w+)'s", m.name_en.lower())
+                    for me in self.graph.get_alt_monsters(m):
+                        for t2 in ts:
+                            if t2 in me.name_en.lower():
+                                self.name_tokens.add(t2, me)
+                else:
+                    for me in self.graph.get_alt_monsters(m):
+                        if token in self._name_to_tokens(me.name_en):
+                            self.name_tokens.add(token, me)
+                            for repl in self.replacement_tokens[token.lower()]:
+                                self.name_tokens.add(repl, me)
+                if token not in HAZARDOUS_IN_NAME_PREFIXES:
+                    for pas in mod_maps:
+                        if token in pas:
+                            self.modifiers[m].update(pas)
+        for token in nametokens:
+            if self.name_tokens.has(token.lower(), m):
+                continue
+            self.fluff_tokens.add(token.lower(), m)
+            for repl in self.replacement_tokens[token.lower()]:
+                self.fluff_tokens.add(repl, m)
+            for pas in mod_maps:
+                if token in pas:
+                    self.modifiers[m].update(pas)
+
+        # Monster Nickname
+        for nick in self.monster_id_to_nickname[m.monster_id]:
+            self.manual_nick.add(nick, m)
+            for pas in mod_maps:
+                if nick in pas:
+                    self.modifiers[m].update(pas)
+
+        # Tree Nickname
+        base_id = self.graph.get_base_id(m)
+        for nick in self.monster_id_to_treename[base_id]:
+            self.manual_tree.add(nick, m)
+            for pas in mod_maps:
+                if nick in pas:
+                    self.modifiers[m].update(pas)
+
+        for modifier in self.modifiers[m]:
+            self.modifier_postings.add(modifier, m)
 
     @staticmethod
     def _name_to_tokens(oname):
@@ -297,7 +393,7 @@ class MonsterIndex2(aobject):
             if not m.on_jp:
                 for t in MISC_MAP[MiscModifiers.ONLYNA]:
                     modifiers.add(t)
-        if m.monster_id + 10000 in self.graph.nodes:
+        if self.graph.get_monster(m.monster_id + 10000) is not None:
             modifiers.add("idjp")
         if m.monster_id > 10000:
             modifiers.add("idna")
@@ -305,19 +401,105 @@ class MonsterIndex2(aobject):
         return modifiers
 
 
-# TODO: Move this to TSUtils
-async def sheet_to_reader(url):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            file = io.StringIO(await response.text())
-    return csv.reader(file, delimiter=',')
+class MonsterOrdinals(object):
+    """Numbers monsters densely from 0, so a set of monsters can be stored as the bits of an int.
+
+    Ordinals are never reused, so bitsets built against an older copy stay valid in a patched one.
+    """
 
+    def __init__(self):
+        self.monsters = []
+        self.ordinals = {}
+        # Every live monster, removed ones keep their ordinal but lose their bit
+        self.all_bits = 0
 
-def combine_tokens(d1, d2):
-    do = defaultdict(set, d1)
-    for k, v in d2.items():
-        do[k].update(v)
-    return do
+    def copy(self):
+        ordinals = MonsterOrdinals()
+        ordinals.monsters = list(self.monsters)
+        ordinals.ordinals = dict(self.ordinals)
+        ordinals.all_bits = self.all_bits
+        return ordinals
+
+    def bit(self, m) -> int:
+        """The bit of m, assigning it an ordinal if it's new and taking m as its current model"""
+        ordinal = self.ordinals.get(m.monster_id)
+        if ordinal is None:
+            ordinal = self.ordinals[m.monster_id] = len(self.monsters)
+            self.monsters.append(m)
+        else:
+            self.monsters[ordinal] = m
+        self.all_bits |= 1 << ordinal
+        return 1 << ordinal
+
+    def mask(self, monster_ids) -> int:
+        bits = 0
+        for monster_id in monster_ids:
+            if monster_id in self.ordinals:
+                bits |= 1 << self.ordinals[monster_id]
+        return bits
+
+    def remove(self, monster_ids):
+        self.all_bits &= ~self.mask(monster_ids)
+
+    def has(self, bits, m) -> bool:
+        ordinal = self.ordinals.get(m.monster_id)
+        return ordinal is not None and bool(bits >> ordinal & 1)
+
+    def decode(self, bits):
+        """The monsters whose bits are set, in ordinal order"""
+        monsters = self.monsters
+        digits = bin(bits)[:1:-1]
+        ordinal = digits.find('1')
+        while ordinal != -1:
+            yield monsters[ordinal]
+            ordinal = digits.find('1', ordinal + 1)
+
+
+class MonsterPostings(object):
+    """A token -> monsters map that stores each monster set as a bitset over MonsterOrdinals"""
+
+    def __init__(self, ordinals: MonsterOrdinals, bits_by_token=None):
+        self.ordinals = ordinals
+        self.bits_by_token = bits_by_token or {}
+
+    def add(self, token, m):
+        self.bits_by_token[token] = self.bits_by_token.get(token, 0) | self.ordinals.bit(m)
+
+    def bits(self, token) -> int:
+        return self.bits_by_token.get(token, 0)
+
+    def has(self, token, m) -> bool:
+        return self.ordinals.has(self.bits(token), m)
+
+    def monsters(self, token):
+        return set(self.ordinals.decode(self.bits(token)))
+
+    def tokens_of(self, m):
+        return [token for token, bits in self.bits_by_token.items() if self.ordinals.has(bits, m)]
+
+    def without(self, removed_bits, ordinals: MonsterOrdinals):
+        """Copies these postings onto ordinals, leaving out removed_bits and any tokens only they had"""
+        kept = {}
+        for token, bits in self.bits_by_token.items():
+            bits &= ~removed_bits
+            if bits:
+                kept[token] = bits
+        return MonsterPostings(ordinals, kept)
+
+    def union(self, other: 'MonsterPostings'):
+        combined = MonsterPostings(self.ordinals, dict(self.bits_by_token))
+        for token, bits in other.bits_by_token.items():
+            combined.bits_by_token[token] = combined.bits_by_token.get(token, 0) | bits
+        return combined
+
+    def __contains__(self, token):
+        return token in self.bits_by_token
+
+    def __iter__(self):
+        return iter(self.bits_by_token)
+
+    def __len__(self):
+        return len(self.bits_by_token)
 
 
 def tcount(tstr):
@@ -0,0 +1,56 @@
+from typing import List
+
+from .fuzzy_token_index import FuzzyTokenIndex
+
+# Words shorter than this have to match exactly, longer ones may match fuzzily
+FUZZY_WORD_LENGTH = 5
+# Nodes with more fuzzy words than this get a FuzzyTokenIndex instead of a plain scan
+_FUZZY_INDEX_MIN_WORDS = 16
+
+
+class MultiWordTrieNode(object):
+    __slots__ = ('children', 'fuzzy_words', 'fuzzy_index', 'rank', 'token')
+
+    def __init__(self):
+        self.children = {}
+        self.fuzzy_words = []
+        self.fuzzy_index = None
+        # Set on nodes that end a multi-word token. Lower ranks win when several tokens match.
+        self.rank = None
+        self.token = None
+
+    def fuzzy_candidates(self, word: str, min_similarity: float) -> List[str]:
+        """The fuzzy words of this node that word may be within min_similarity of"""
+        if self.fuzzy_index is None:
+            return self.fuzzy_words
+        return self.fuzzy_index.jaro_winkler_candidates(word, min_similarity)
+
+
+class MultiWordTrie(object):
+    """Multi-word tokens as a trie over their words, so a query is matched against all of them at once.
+
+    Tokens are ranked the way they used to be tried one by one: most words first, then longest.
+    """
+
+    def __init__(self, multi_word_tokens):
+        self.root = MultiWordTrieNode()
+        ranked = sorted(multi_word_tokens, key=lambda x: (len(x), len(''.join(x))), reverse=True)
+        for rank, words in enumerate(ranked):
+            node = self.root
+            for word in words:
+                if word not in node.children:
+                    node.children[word] = MultiWordTrieNode()
+                    if len(word) >= FUZZY_WORD_LENGTH:
+                        node.fuzzy_words.append(word)
+                node = node.children[word]
+            node.rank = rank
+            node.token = ''.join(words)
+        self._index_fuzzy_words(self.root)
+
+    def _index_fuzzy_words(self, root: MultiWordTrieNode):
+        pending = [root]
+        while pending:
+            node = pending.pop()
+            if len(node.fuzzy_words) > _FUZZY_INDEX_MIN_WORDS:
+                node.fuzzy_index = FuzzyTokenIndex(node.fuzzy_words)
+            pending.extend(node.children.values())
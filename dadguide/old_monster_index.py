@@ -1,7 +1,8 @@
+import bisect
 import difflib
+import re
 
 from redbot.core.utils import AsyncIter
-from discord.utils import find as find_first
 import tsutils
 
 from collections import defaultdict
@@ -14,6 +15,7 @@ from dadguide.models.enum_types import Attribute, MonsterType
 from dadguide.models.monster_model import MonsterModel
 from dadguide.models.series_model import SeriesModel
 from .database_context import DbContext
+from .database_snapshot import restore_object
 
 
 class MonsterIndex(tsutils.aobject):
@@ -55,6 +57,38 @@ class MonsterIndex(tsutils.aobject):
             117: ['gh', 'gungho'],
         }
 
+        named_monsters = await self._build_named_monsters(base_monster_ids, nickname_overrides,
+                                                         treename_overrides, accept_filter)
+        self._build_entries(named_monsters, nickname_overrides, panthname_overrides)
+
+    __init__ = __ainit__
+
+    def __reduce__(self):
+        # Leave the db context behind, it's reattached when loading a snapshot
+        state = self.__dict__.copy()
+        state['db_context'] = None
+        return restore_object, (self.__class__, state)
+
+    async def patched(self, monster_database: DbContext, monster_ids, nickname_overrides,
+                      treename_overrides, panthname_overrides, accept_filter=None):
+        """Returns a copy of this index with the evo trees containing monster_ids rebuilt.
+
+        monster_ids must be closed over alt trees, both before and after the change.
+        """
+        index = restore_object(self.__class__, self.__dict__.copy())
+        index.db_context = monster_database
+        graph = monster_database.graph
+        base_monsters = [m for m in map(graph.get_monster, sorted(monster_ids))
+                         if m is not None and graph.monster_is_base(m)]
+        named_monsters = [nm for nm in self.all_monsters if nm.monster_id not in monster_ids]
+        named_monsters += await index._build_named_monsters(base_monsters, nickname_overrides,
+                                                            treename_overrides, accept_filter)
+        index._build_entries(named_monsters, nickname_overrides, panthname_overrides)
+        return index
+
+    async def _build_named_monsters(self, base_monster_ids, nickname_overrides, treename_overrides,
+                                    accept_filter):
+        monster_database = self.db_context
         monster_id_to_nicknames = defaultdict(set)
         for monster_id, nicknames in nickname_overrides.items():
             monster_id_to_nicknames[monster_id] = nicknames
@@ -84,7 +118,9 @@ class MonsterIndex(tsutils.aobject):
                 named_evolution_tree.append(named_monster)
             for named_monster in named_evolution_tree:
                 named_monster.set_evolution_tree(named_evolution_tree)
+        return named_monsters
 
+    def _build_entries(self, named_monsters, nickname_overrides, panthname_overrides):
         # Sort the NamedMonsters into the opposite order we want to accept their nicknames in
         # This order is:
         #  1) High priority first
@@ -134,7 +170,31 @@ class MonsterIndex(tsutils.aobject):
                 for nickname in nicknames:
                     self.all_entries[nickname] = nm
 
-    __init__ = __ainit__
+        self._build_lookup_indexes()
+
+    def _build_lookup_indexes(self):
+        """Precomputes what the fallback stages of find_monster search, so they don't scan every entry"""
+        self.nickname_index = SortedKeyIndex(self.all_entries.items())
+        # Only monsters reachable through a nickname are ever returned by the fallback stages
+        self.entry_monsters = {nm.monster_id: nm for nm in self.all_entries.values()}
+        entry_names = [(nm, nm.name_en.lower(), nm.name_ja.lower()) for nm in self.entry_monsters.values()]
+        self.name_en_index = SortedKeyIndex((name_en, nm) for nm, name_en, _ in entry_names)
+        self.name_ja_index = SortedKeyIndex((name_ja, nm) for nm, _, name_ja in entry_names)
+        # The substring stages of find_monster only look at entry monsters, those of find_monster2
+        # at the monsters in all_en_name_to_monsters
+        self.name_trigrams = TrigramIndex((nm, (nm.name_en.lower(), nm.name_ja.lower())) for nm in self.all_monsters)
+        self.entry_rows = self.name_trigrams.mask(self.entry_monsters.values())
+        self.en_name_rows = self.name_trigrams.mask(self.all_en_name_to_monsters.values())
+
+    def find_base_id_matches(self, query):
+        """The base of the monster a query ending in 'base <id>' refers to"""
+        match = re.search(r'base ([0-9]+)$', query)
+        if match is None or str(int(match.group(1))) != match.group(1):
+            return set()
+        m = self.entry_monsters.get(int(match.group(1)))
+        if m is None:
+            return set()
+        return {self.entry_monsters.get(m.base_monster_no)}
 
     def init_index(self):
         pass
@@ -257,36 +317,26 @@ class MonsterIndex(tsutils.aobject):
             return None, 'Your query must be at least 4 letters', None
 
         # TODO: this should be a length-limited priority queue
-        matches = set()
-
         # prefix search for ids, take max id
-        for nickname, m in self.all_entries.items():
-            if query.endswith("base {}".format(m.monster_id)):
-                matches.add(
-                    find_first(lambda mo: m.base_monster_no == mo.monster_id, self.all_entries.values()))
+        matches = self.find_base_id_matches(query)
         if len(matches):
             return self.pick_best_monster(matches), None, "Base ID match, max of 1".format()
 
         # prefix search for nicknames, space-preceeded, take max id
-        for nickname, m in self.all_entries.items():
-            if nickname.startswith(query + ' '):
-                matches.add(m)
+        matches.update(self.nickname_index.prefixed(query + ' '))
         if len(matches):
             return self.pick_best_monster(matches), None, "Space nickname prefix, max of {}".format(len(matches))
 
         # prefix search for nicknames, take max id
-        for nickname, m in self.all_entries.items():
-            if nickname.startswith(query):
-                matches.add(m)
+        matches.update(self.nickname_index.prefixed(query))
         if len(matches):
             all_names = ",".join(map(lambda x: x.name_en, matches))
             return self.pick_best_monster(matches), None, "Nickname prefix, max of {}, matches=({})".format(
                 len(matches), all_names)
 
         # prefix search for full name, take max id
-        for nickname, m in self.all_entries.items():
-            if m.name_en.lower().startswith(query) or m.name_ja.lower().startswith(query):
-                matches.add(m)
+        matches.update(self.name_en_index.prefixed(query))
+        matches.update(self.name_ja_index.prefixed(query))
         if len(matches):
             return self.pick_best_monster(matches), None, "Full name, max of {}".format(len(matches))
 
@@ -297,9 +347,7 @@ class MonsterIndex(tsutils.aobject):
         # TODO: refactor 2nd search characteristcs for 2nd word
 
         # full name contains on nickname, take max id
-        for nickname, m in self.all_entries.items():
-            if query in m.name_en.lower() or query in m.name_ja.lower():
-                matches.add(m)
+        matches.update(self.name_trigrams.containing_all([query], self.entry_rows))
         if len(matches):
             return self.pick_best_monster(matches), None, 'Nickname contains nickname match ({})'.format(
                 len(matches))
@@ -318,11 +366,7 @@ class MonsterIndex(tsutils.aobject):
             return self.all_en_name_to_monsters[match], None, 'Close name match ({})'.format(match)
 
         # About to give up, try matching all words
-        matches = set()
-        for nickname, m in self.all_entries.items():
-            if (all(map(lambda x: x in m.name_en.lower(), query.split())) or
-                            all(map(lambda x: x in m.name_ja.lower(), query.split()))):
-                matches.add(m)
+        matches = set(self.name_trigrams.containing_all(query.split(), self.entry_rows))
         if len(matches):
             return self.pick_best_monster(matches), None, 'All word match on full name, max of {}'.format(
                 len(matches))
@@ -376,10 +420,7 @@ class MonsterIndex(tsutils.aobject):
         matches = PotentialMatches()
 
         # prefix search for ids, take max id
-        for nickname, m in self.all_entries.items():
-            if query.endswith("base {}".format(m.monster_id)):
-                matches.add(
-                    find_first(lambda mo: m.base_monster_no == mo.monster_id, self.all_entries.values()))
+        matches.update(self.find_base_id_matches(query))
         matches.update_list(query_prefixes)
 
         # first try to get matches from nicknames
@@ -391,9 +432,7 @@ class MonsterIndex(tsutils.aobject):
         # if we don't have any candidates yet, pick a new method
         if not matches.length():
             # try matching on exact names next
-            for nickname, m in self.all_en_name_to_monsters.items():
-                if new_query in m.name_en.lower() or new_query in m.name_ja.lower():
-                    matches.add(m)
+            matches.update(self.name_trigrams.containing_all([new_query], self.en_name_rows))
             matches.update_list(query_prefixes)
 
         # check for exact match on pantheon name but only if needed
@@ -421,6 +460,70 @@ class MonsterIndex(tsutils.aobject):
         return max(named_monster_list, key=lambda x: (not x.is_low_priority, x.rarity, x.monster_no_na))
 
 
+class SortedKeyIndex(object):
+    """Values kept in the order of their keys, so every key starting with a prefix is one bisected range"""
+
+    def __init__(self, items):
+        items = sorted(items, key=lambda kv: kv[0])
+        self.keys = [k for k, _ in items]
+        self.values = [v for _, v in items]
+
+    def prefixed(self, prefix: str) -> list:
+        start = bisect.bisect_left(self.keys, prefix)
+        # Every key starting with prefix sorts before prefix with its last character incremented
+        end = bisect.bisect_left(self.keys, prefix[:-1] + chr(ord(prefix[-1]) + 1), start)
+        return self.values[start:end]
+
+
+def _trigrams(string: str) -> set:
+    return {string[i:i + 3] for i in range(len(string) - 2)}
+
+
+class TrigramIndex(object):
+    """Finds the values with a string containing every one of a list of substrings.
+
+    Each value has a tuple of strings, and matches if any one of them contains all the substrings.
+    Postings are bitsets over the values, one per trigram, so only the values holding every
+    trigram of the substrings get checked. Substrings shorter than a trigram don't narrow anything.
+    """
+
+    def __init__(self, values_and_strings):
+        self.values = []
+        self.strings = []
+        self.rows = {}
+        self.postings = {}
+        for value, strings in values_and_strings:
+            bit = 1 << len(self.values)
+            self.rows[value] = len(self.values)
+            self.values.append(value)
+            self.strings.append(strings)
+            for trigram in set().union(*map(_trigrams, strings)):
+                self.postings[trigram] = self.postings.get(trigram, 0) | bit
+        self.all_rows = (1 << len(self.values)) - 1
+
+    def mask(self, values) -> int:
+        """The bitset of rows holding values"""
+        bits = 0
+        for value in values:
+            bits |= 1 << self.rows[value]
+        return bits
+
+    def containing_all(self, substrings, rows=None) -> list:
+        """The values (restricted to the bitset rows, if given) with a string containing every substring"""
+        bits = self.all_rows if rows is None else rows
+        for substring in substrings:
+            for trigram in _trigrams(substring):
+                bits &= self.postings.get(trigram, 0)
+        matches = []
+        digits = bin(bits)[:1:-1]
+        row = digits.find('1')
+        while row != -1:
+            if any(all(s in string for s in substrings) for string in self.strings[row]):
+                matches.append(self.values[row])
+            row = digits.find('1', row + 1)
+        return matches
+
+
 class PotentialMatches(object):
     def __init__(self):
         self.match_list = set()
@@ -0,0 +1,60 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .models.enum_types import Attribute, MonsterType, Server
+from .models.monster_model import MonsterModel
+from .models.monster_stats import MonsterStatsTable
+
+
+class StatLeaderboard(object):
+    """Ranks monsters by a stat without scanning and sorting all of them per query.
+
+    Every (stat, level, +297) ranking is sorted once, on first use, and kept for the rest of the
+    generation. Attribute, type and server filters are bitmasks over the same rows, so a query is
+    one masked pass over a presorted array.
+    """
+    STATS = ('hp', 'atk', 'rcv', 'weighted')
+    LEVELS = (99, 110, 120)
+    # Filter names accepted by top, so client cogs don't need the enums
+    ATTRIBUTES = {a.name.lower(): a for a in Attribute}
+    TYPES = {t.name.lower(): t for t in MonsterType}
+    SERVERS = {s.name.lower(): s for s in Server}
+
+    def __init__(self, monsters, stats_table: MonsterStatsTable):
+        self.monsters = tuple(monsters)
+        self.stats_table = stats_table
+        self.attribute_bits = np.array([1 << m.attr1.value for m in self.monsters], dtype=np.int64)
+        self.type_bits = np.array([sum(1 << t.value for t in m.types) for m in self.monsters],
+                                  dtype=np.int64)
+        self.server_bits = np.array([(m.on_jp << Server.JP.value) | (m.on_na << Server.NA.value)
+                                     | (m.on_kr << Server.KR.value) for m in self.monsters],
+                                    dtype=np.int64)
+        # (stat, lv, plus_297) -> (stat values, rows sorted by descending value)
+        self._rankings = {}
+
+    def top(self, count: int, stat: str, lv: int = 110, plus_297: bool = False,
+            attribute: Optional[str] = None, monster_type: Optional[str] = None,
+            server: Optional[str] = None) -> List[Tuple[MonsterModel, int]]:
+        """The count monsters with the highest stat, paired with its value.
+
+        attribute (the main one), monster_type and server are lowercase enum names.
+        """
+        values, order = self._get_ranking(stat, lv, plus_297)
+        mask = np.ones(len(self.monsters), dtype=bool)
+        for bits, by_name, name in ((self.attribute_bits, self.ATTRIBUTES, attribute),
+                                    (self.type_bits, self.TYPES, monster_type),
+                                    (self.server_bits, self.SERVERS, server)):
+            if name is not None:
+                mask &= (bits & (1 << by_name[name].value)) != 0
+        rows = order[mask[order]][:count]
+        return [(self.monsters[row], int(values[row])) for row in rows.tolist()]
+
+    def _get_ranking(self, stat: str, lv: int, plus_297: bool):
+        key = (stat, lv, plus_297)
+        if key not in self._rankings:
+            hp, atk, rcv, weighted = self.stats_table.stats(lv=lv, plus=297 if plus_297 else 0)
+            values = {'hp': hp, 'atk': atk, 'rcv': rcv, 'weighted': weighted}[stat]
+            # Stable, so ties stay in monster_id order
+            self._rankings[key] = (values, np.argsort(-values, kind='stable'))
+        return self._rankings[key]
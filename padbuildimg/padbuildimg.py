@@ -444,11 +444,14 @@ class PadBuildImageGenerator(object):
             'INSTRUCTION': None
         }
         self.build_img = None
+        # Lookup results by query, filled in for the whole build at once by prefetch_cards
+        self.cards = {}
 
     async def process_build(self, input_str):
         team_strings = [row for row in csv.reader(re.split('[;\n]', input_str), delimiter='/') if len(row) > 0]
         if len(team_strings) > 3:
             team_strings = team_strings[0:3]
+        await self.prefetch_cards([slot for team in team_strings for slot in team])
         for team in team_strings:
             team_sublist = []
             for slot in team:
@@ -459,6 +462,38 @@ class PadBuildImageGenerator(object):
                     raise ex
             self.build['TEAM'].append(team_sublist)
 
+    async def prefetch_cards(self, card_strs):
+        """Looks up every card and assist named in card_strs in one batch"""
+        queries = []
+        for card_str in card_strs:
+            queries.extend(self.card_queries(card_str))
+        if queries:
+            results = await self.padinfo_cog.find_monsters_batch(queries)
+            self.cards.update(zip(queries, results))
+
+    def card_queries(self, card_str, is_assist=False):
+        queries = []
+        assist_str = None
+        self.lexer.input(card_str)
+        try:
+            for tok in iter(self.lexer.token, None):
+                if tok.type == 'ASSIST':
+                    assist_str = tok.value
+                    queries.append(tok.value)
+                elif tok.type == 'ID' and tok.value.lower() != 'sdr':
+                    queries.append(tok.value)
+        except commands.UserFeedbackCheckFailure:
+            # Left for process_card to raise, so errors are reported in the same order as before
+            return queries
+        if assist_str is not None and not is_assist:
+            queries.extend(self.card_queries(assist_str, is_assist=True))
+        return queries
+
+    async def find_card(self, query):
+        if query not in self.cards:
+            self.cards[query] = await self.padinfo_cog.findMonster1(query)
+        return self.cards[query]
+
     async def process_card(self, card_str, is_assist=False):
         if not is_assist:
             result_card = {
@@ -507,7 +542,7 @@ class PadBuildImageGenerator(object):
         for tok in iter(self.lexer.token, None):
             if tok.type == 'ASSIST':
                 assist_str = tok.value
-                ass_card, err, debug_info = await self.padinfo_cog.findMonster1(tok.value)
+                ass_card, err, debug_info = await self.find_card(tok.value)
                 if ass_card is None:
                     raise commands.UserFeedbackCheckFailure('Lookup Error: {}'.format(err))
             elif tok.type == 'REPEAT':
@@ -517,7 +552,7 @@ class PadBuildImageGenerator(object):
                     result_card['ID'] = DELAY_BUFFER
                     card = DELAY_BUFFER
                 else:
-                    card, err, debug_info = await self.padinfo_cog.findMonster1(tok.value)
+                    card, err, debug_info = await self.find_card(tok.value)
                     if card is None:
                         raise commands.UserFeedbackCheckFailure('Lookup Error: {}'.format(err))
                     if not card.is_inheritable:
@@ -84,12 +84,13 @@ class PadEvents(commands.Cog):
     async def refresh_data(self):
         dg_cog = self.bot.get_cog('Dadguide')
         await dg_cog.wait_until_ready()
-        scheduled_events = dg_cog.database.get_all_events()
+        # Build every event against the same generation of the database
+        db_context = dg_cog.database
+        scheduled_events = db_context.get_all_events()
 
         new_events = []
         for se in scheduled_events:
             try:
-                db_context = self.bot.get_cog("Dadguide").database
                 new_events.append(Event(se, db_context))
             except Exception as ex:
                 logger.exception("Refresh error:")
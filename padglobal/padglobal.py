@@ -306,7 +306,8 @@ class PadGlobal(commands.Cog):
         async with ctx.typing():
             start = time.perf_counter()
             dadguide_cog = self.bot.get_cog('Dadguide')
-            dadguide_cog.index2 = await dadguide_cog.create_index2()
+            # id3 reads the same override sheets, a refresh rebuilds it if any of them changed
+            await dadguide_cog.reload_config_files()
             await ctx.send('Reload finished in {} seconds.'.format(time.perf_counter() - start))
 
     @commands.group(aliases=['pdg'])
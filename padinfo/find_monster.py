@@ -3,16 +3,6 @@ from typing import Set
 
 from Levenshtein import jaro_winkler
 
-SERIES_TYPE_PRIORITY = {
-    "regular": 4,
-    "event": 4,
-    "seasonal": 3,
-    "ghcollab": 2,
-    "collab": 1,
-    None: 0
-}
-
-
 def calc_ratio(s1, s2):
     return jaro_winkler(s1, s2, .05)
 
@@ -29,50 +19,62 @@ class FindMonster:
     MODIFIER_JW_DISTANCE = .95
     TOKEN_JW_DISTANCE = .8
 
-    def _merge_multi_word_tokens(self, tokens, valid_multi_word_tokens):
+    def _merge_multi_word_tokens(self, tokens, multi_word_trie):
         result = []
-        s = 0
-        multi_word_tokens_sorted = sorted(valid_multi_word_tokens,
-                                          key=lambda x: (len(x), len(''.join(x))),
-                                          reverse=True)
-        for c1, token in enumerate(tokens):
-            if s:
-                s -= 1
-                continue
-            for mwt in multi_word_tokens_sorted:
-                if len(mwt) > len(tokens) - c1:
-                    continue
-                for c2, t in enumerate(mwt):
-                    if (tokens[c1 + c2] != t and len(t) < 5) or calc_ratio(tokens[c1 + c2], t) < self.TOKEN_JW_DISTANCE:
-                        break
-                else:
-                    s = len(mwt) - 1
-                    result.append("".join(mwt))
-                    break
+        c1 = 0
+        while c1 < len(tokens):
+            match = self._match_multi_word_token(tokens, c1, multi_word_trie)
+            if match is None:
+                result.append(tokens[c1])
+                c1 += 1
             else:
+                token, c1 = match
                 result.append(token)
         return result
 
-    def _monster_has_token(self, monster, token, monsterscore, monster_mods):
+    def _match_multi_word_token(self, tokens, start, multi_word_trie):
+        """The best ranked multi-word token starting at tokens[start] and the position after it, if any.
+
+        Words shorter than 5 characters have to match exactly, longer ones within TOKEN_JW_DISTANCE.
+        """
+        best = None
+        best_end = None
+        pending = [(multi_word_trie.root, start)]
+        while pending:
+            node, pos = pending.pop()
+            if node.rank is not None and (best is None or node.rank < best.rank):
+                best, best_end = node, pos
+            if pos == len(tokens):
+                continue
+            token = tokens[pos]
+            if token in node.children:
+                pending.append((node.children[token], pos + 1))
+            for word in node.fuzzy_candidates(token, self.TOKEN_JW_DISTANCE):
+                if word != token and calc_ratio(token, word) >= self.TOKEN_JW_DISTANCE:
+                    pending.append((node.children[word], pos + 1))
+        if best is None:
+            return None
+        return best.token, best_end
+
+    def _modifier_matches(self, token, index2):
+        """(score, monster bitset) for each modifier token matches, best first.
+
+        Short tokens have to match a modifier exactly. Longer ones match every modifier within
+        TOKEN_JW_DISTANCE, and a monster scores the closest of the modifiers it has.
+        """
         if len(token) < 6:
-            if token in monster_mods:
-                monsterscore[monster] += 1
-                return True
-        else:
-            closest = max(jaro_winkler(m, token, .05) for m in monster_mods)
-            if closest > self.TOKEN_JW_DISTANCE:
-                monsterscore[monster] += closest
-                return True
-        return False
+            return [(1, index2.modifier_postings.bits(token))]
+        matches = [(jaro_winkler(p, token, .05), p) for p in index2.all_modifiers]
+        return [(score, index2.modifier_postings.bits(p))
+                for score, p in sorted(matches, reverse=True) if score > self.TOKEN_JW_DISTANCE]
 
     def interpret_query(self, raw_query: str, index2) -> (Set[str], Set[str]):
         tokenized_query = raw_query.split()
-        tokenized_query = self._merge_multi_word_tokens(tokenized_query, index2.multi_word_tokens)
+        tokenized_query = self._merge_multi_word_tokens(tokenized_query, index2.multi_word_trie)
 
         modifiers = []
         negative_modifiers = set()
         name = set()
-        longmods = [p for p in index2.all_modifiers if len(p) > 8]
         lastmodpos = False
 
         for i, token in enumerate(tokenized_query[::-1]):
@@ -92,9 +94,9 @@ class FindMonster:
             negated = token.startswith("-")
             token = token.lstrip('-')
             if token in index2.all_modifiers or (
-                    any(jaro_winkler(m, token) > self.MODIFIER_JW_DISTANCE for m in longmods)
-                    and token not in index2.all_name_tokens
-                    and len(token) >= 8):
+                    len(token) >= 8
+                    and token not in index2.name_token_index
+                    and any(jaro_winkler(m, token) > self.MODIFIER_JW_DISTANCE for m in index2.long_modifiers)):
                 if negated:
                     lastmodpos = False
                     negative_modifiers.add(token)
@@ -106,63 +108,87 @@ class FindMonster:
                 break
 
         if not name and modifiers and lastmodpos:
-            if index2.manual[modifiers[-1]]:
+            if index2.manual.bits(modifiers[-1]):
                 name.add(modifiers[-1])
                 modifiers = modifiers[:-1]
 
         return set(modifiers), negative_modifiers, name
 
-    def process_name_tokens(self, name_query_tokens, index2):
+    def _name_token_matches(self, t, index2, token_matches=None):
+        """Name tokens close to or starting with t, best first.
+
+        token_matches memoizes them, so queries resolved in a batch share their matching work.
+        """
+        if token_matches is not None and t in token_matches:
+            return token_matches[t]
+        # Only score the tokens the index can't rule out, each of them once
+        scored = [(jaro_winkler(t, nt, .05), nt) for nt in
+                  index2.name_token_index.jaro_winkler_candidates(t, self.TOKEN_JW_DISTANCE)]
+        ms = [nt for score, nt in sorted([s for s in scored if s[0] > self.TOKEN_JW_DISTANCE],
+                                         key=lambda s: s[0], reverse=True)]
+        ms += index2.name_token_index.prefixed(t)
+        if token_matches is not None:
+            token_matches[t] = ms
+        return ms
+
+    def process_name_tokens(self, name_query_tokens, index2, token_matches=None):
+        """Returns the bitset of monsters matching every name token, along with their scores"""
         monstergen = None
         monsterscore = defaultdict(int)
 
         for t in name_query_tokens:
-            valid = set()
-            ms = sorted([nt for nt in index2.all_name_tokens if jaro_winkler(t, nt, .05) > self.TOKEN_JW_DISTANCE],
-                        key=lambda nt: jaro_winkler(t, nt, .05), reverse=True)
-            ms += [token for token in index2.all_name_tokens if token.startswith(t)]
+            valid = 0
+            ms = self._name_token_matches(t, index2, token_matches)
             if not ms:
                 return None, None
             for match in ms:
-                for m in index2.manual[match]:
-                    if m not in valid:
-                        monsterscore[m] += calc_ratio_prefix(t, match) + .001
-                        valid.add(m)
-                for m in index2.name_tokens[match]:
-                    if m not in valid:
-                        monsterscore[m] += calc_ratio_prefix(t, match)
-                        valid.add(m)
-                for m in index2.fluff_tokens[match]:
-                    if m not in valid:
-                        monsterscore[m] += calc_ratio_prefix(t, match) / 2
-                        valid.add(m)
+                ratio = calc_ratio_prefix(t, match)
+                # Each monster is scored by the first posting it shows up in
+                for postings, score in ((index2.manual, ratio + .001),
+                                        (index2.name_tokens, ratio),
+                                        (index2.fluff_tokens, ratio / 2)):
+                    new = postings.bits(match) & ~valid
+                    if new:
+                        for m in index2.ordinals.decode(new):
+                            monsterscore[m] += score
+                        valid |= new
 
             if monstergen is not None:
-                monstergen.intersection_update(valid)
+                monstergen &= valid
             else:
                 monstergen = valid
 
         return monstergen, monsterscore
 
-    def process_modifiers(self, mod_tokens, neg_mod_tokens, monsterscore, potential_evos, monster_mods):
+    def process_modifiers(self, mod_tokens, neg_mod_tokens, monsterscore, potential_evos, index2):
+        """Filters the potential_evos bitset by modifiers, returning the monsters left"""
         for t in mod_tokens:
-            potential_evos = {m for m in potential_evos if
-                              self._monster_has_token(m, t, monsterscore, monster_mods[m])}
+            matched = 0
+            for score, bits in self._modifier_matches(t, index2):
+                new = bits & potential_evos & ~matched
+                if new:
+                    for m in index2.ordinals.decode(new):
+                        monsterscore[m] += score
+                    matched |= new
+            potential_evos = matched
             if not potential_evos:
                 return None
         for t in neg_mod_tokens:
-            potential_evos = {m for m in potential_evos if
-                              not self._monster_has_token(m, t, monsterscore, monster_mods[m])}
+            for _, bits in self._modifier_matches(t, index2):
+                potential_evos &= ~bits
             if not potential_evos:
                 return None
 
-        return potential_evos
+        return set(index2.ordinals.decode(potential_evos))
 
-    def get_monster_evos(self, database, monster_gen, monster_score):
-        monster_evos = set()
-        for m in sorted(monster_gen, key=lambda m: monster_score[m], reverse=True):
-            for evo in database.graph.get_alt_monsters(m):
-                monster_evos.add(evo)
+    def get_monster_evos(self, index2, monster_gen, monster_score):
+        """Expands the monster_gen bitset to whole evo trees"""
+        graph = index2.graph
+        monster_evos = 0
+        for m in sorted(index2.ordinals.decode(monster_gen), key=lambda m: monster_score[m], reverse=True):
+            alt_ids = graph.get_alt_ids_by_id(m.monster_id)
+            monster_evos |= index2.tree_bits[alt_ids]
+            for evo in graph.get_alt_monsters_by_id(m.monster_id):
                 if monster_score[evo] < monster_score[m]:
                     monster_score[evo] = monster_score[m] - .003
 
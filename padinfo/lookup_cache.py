@@ -0,0 +1,61 @@
+from collections import Counter, OrderedDict
+
+# Returned by LookupCache.get when there's no entry, since None is a valid lookup result
+MISSING = object()
+
+
+class LookupCache(object):
+    """Bounded LRU cache of monster lookups, keyed on the dadguide generation they were made against.
+
+    Keys are tuples starting with the lookup flavor (id1, id2, id3), which is what the hit and miss
+    counters are split by. Entries from older generations are dropped as soon as a lookup is made
+    against a newer one.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.generation = None
+        self.entries = OrderedDict()
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def get(self, key: tuple, generation: int):
+        if generation != self.generation:
+            self.entries.clear()
+            self.generation = generation
+        if key not in self.entries:
+            self.misses[key[0]] += 1
+            return MISSING
+        self.entries.move_to_end(key)
+        self.hits[key[0]] += 1
+        return self.entries[key]
+
+    def put(self, key: tuple, generation: int, value):
+        if generation != self.generation:
+            # Computed against a generation that has since been replaced
+            return
+        self.entries[key] = value
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def get_or_compute(self, key: tuple, generation: int, compute):
+        value = self.get(key, generation)
+        if value is MISSING:
+            value = compute()
+            self.put(key, generation, value)
+        return value
+
+    def clear(self):
+        self.entries.clear()
+        self.hits.clear()
+        self.misses.clear()
+
+    def stats_table(self) -> str:
+        lines = ['{} of {} entries, dadguide generation {}'.format(
+            len(self.entries), self.max_size, self.generation), '',
+            '{:<8}{:>10}{:>10}{:>10}'.format('flavor', 'hits', 'misses', 'hit rate')]
+        for flavor in sorted(set(self.hits) | set(self.misses)):
+            total = self.hits[flavor] + self.misses[flavor]
+            lines.append('{:<8}{:>10,}{:>10,}{:>9.1%}'.format(
+                flavor, self.hits[flavor], self.misses[flavor], self.hits[flavor] / total))
+        return '\n'.join(lines)
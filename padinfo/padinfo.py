@@ -16,14 +16,14 @@ import tsutils
 from Levenshtein import jaro_winkler
 from discordmenu.emoji_cache import emoji_cache
 from redbot.core import checks, commands, data_manager, Config
-from redbot.core.utils import AsyncIter
 from redbot.core.utils.chat_formatting import box, inline, pagify, text_to_file
 from tabulate import tabulate
 from tsutils import CogSettings, EmojiUpdater, Menu, char_to_emoji, rmdiacritics, safe_read_json, is_donor
 
 from .button_info import button_info
-from .find_monster import find_monster, SERIES_TYPE_PRIORITY as series_priority
+from .find_monster import find_monster
 from .id_menu import IdMenu
+from .lookup_cache import MISSING, LookupCache
 from .view.components.monster.header import MonsterHeader
 
 if TYPE_CHECKING:
@@ -35,6 +35,10 @@ logger = logging.getLogger('red.padbot-cogs.padinfo')
 
 EMBED_NOT_GENERATED = -1
 
+LOOKUP_CACHE_SIZE = 10000
+# Queries iddiff resolves between progress updates
+IDDIFF_BATCH_SIZE = 500
+
 IDGUIDE = "https://github.com/TsubakiBotPad/pad-cogs/wiki/%5Eid-user-guide"
 
 
@@ -161,7 +165,8 @@ class PadInfo(commands.Cog):
         self.index_all = None
         self.index_na = None
         self.index_jp = None
-        self.index_lock = asyncio.Lock()
+        # Dadguide generation number the indexes above were taken from
+        self.index_generation = None
 
         self.menu = Menu(bot)
 
@@ -191,6 +196,9 @@ class PadInfo(commands.Cog):
         self.historic_lookups_file_path_id3 = _data_file('historic_lookups_id3.json')
         self.historic_lookups_id3 = safe_read_json(self.historic_lookups_file_path_id3)
 
+        # Results of findMonster1/2/3, for the current dadguide generation only
+        self.lookup_cache = LookupCache(LOOKUP_CACHE_SIZE)
+
         self.config = Config.get_conf(self, identifier=9401770)
         self.config.register_user(survey_mode=0, color=None, beta_id3=False)
         self.config.register_global(sometimes_perc=20, good=0, bad=0, do_survey=False, test_suite={})
@@ -206,6 +214,7 @@ class PadInfo(commands.Cog):
         self.historic_lookups = {}
         self.historic_lookups_id2 = {}
         self.historic_lookups_id3 = {}
+        self.lookup_cache.clear()
 
     async def red_get_data_for_user(self, *, user_id):
         """Get a user's personal data."""
@@ -239,18 +248,29 @@ class PadInfo(commands.Cog):
             return
         logger.info('Waiting until DG is ready')
         await dg_cog.wait_until_ready()
+        self._load_indexes(dg_cog)
+        logger.info('Done refreshing indexes')
 
-        async with self.index_lock:
-            logger.debug('Loading ALL index')
-            self.index_all = await dg_cog.create_index()
-
-            logger.debug('Loading NA index')
-            self.index_na = await dg_cog.create_index(lambda m: m.on_na)
+    def _load_indexes(self, dg_cog):
+        # Taken from a single generation in one go, so lookups never mix old and new indexes
+        generation = dg_cog.generation
+        self.index_all = generation.index
+        self.index_na = generation.server_indexes['na']
+        self.index_jp = generation.server_indexes['jp']
+        self.index_generation = generation.number
 
-            logger.debug('Loading JP index')
-            self.index_jp = await dg_cog.create_index(lambda m: m.on_jp)
+    def _get_monster_index(self, server_filter):
+        dg_cog = self.bot.get_cog('Dadguide')
+        if dg_cog.generation_number != self.index_generation:
+            self._load_indexes(dg_cog)
 
-        logger.info('Done refreshing indexes')
+        if server_filter.value == ServerFilter.any.value:
+            return self.index_all
+        elif server_filter.value == ServerFilter.na.value:
+            return self.index_na
+        elif server_filter.value == ServerFilter.jp.value:
+            return self.index_jp
+        raise ValueError("server_filter must be type ServerFilter not " + str(type(server_filter)))
 
     def get_monster(self, monster_id: int):
         dg_cog = self.bot.get_cog('Dadguide')
@@ -685,22 +705,29 @@ class PadInfo(commands.Cog):
                 # split on first separator, with if x.strip() block to prevent null values from showing up, mainly for quotes support
                 # right query is the rest of query but in list form because of how .strip() works. bring it back to string form with ' '.join
                 right_query = ' '.join(q for q in right_query)
-                if sep == ' ':
-                    # Handle a very specific failure case, user typing something like "uuvo ragdra"
-                    nm, err, debug_info = await self._findMonster(whole_query)
-                    if not err and left_query in nm.prefixes:
-                        left_query = whole_query
-                        right_query = None
-
+                # Handle a very specific failure case, user typing something like "uuvo ragdra"
+                check_whole_query = sep == ' '
                 break
 
         else:  # no separators
             left_query, right_query = whole_query, None
 
-        left_m, left_err, _ = await self.findMonsterCustom(ctx, left_query)
         if right_query:
-            right_m, right_err, _ = await self.findMonsterCustom(ctx, right_query)
-        else:
+            # The whole query check is resolved alongside both halves, since it rarely wins
+            flavor = await self.get_lookup_flavor(ctx)
+            lookups = [(flavor, left_query), (flavor, right_query)]
+            if check_whole_query:
+                lookups.append(('id1', whole_query))
+            left, right, *whole = await self._lookup_batch(lookups)
+            if whole and not whole[0][1] and left_query in whole[0][0].prefixes:
+                left_query = whole_query
+                right_query = None
+            else:
+                (left_m, left_err, _), (right_m, right_err, _) = self._record_lookups(
+                    flavor, [left_query, right_query], [left, right])
+
+        if not right_query:
+            left_m, left_err, _ = await self.findMonsterCustom(ctx, left_query)
             right_m, right_err, = left_m, left_err
 
         err_msg = '{} query failed to match a monster: [ {} ]. If your query is multiple words, try separating the queries with / or wrap with quotes.'
@@ -809,8 +836,8 @@ class PadInfo(commands.Cog):
         o = ""
         ml = len(max(suite, key=len)) + 2
         async with ctx.typing():
-            for q, r in suite.items():
-                m = await self.findMonster3(q)
+            results = await self.find_monsters_batch(list(suite), 'id3')
+            for (q, r), (m, _, _) in zip(suite.items(), results):
                 mid = m and m.monster_id
                 if m is not None and m.monster_id != r['result'] or m is None and r['result'] >= 0:
                     reason = '   Reason: ' + r.get('reason') if 'reason' in r else ''
@@ -974,6 +1001,15 @@ class PadInfo(commands.Cog):
         ess = self.settings.emojiServers()
         await ctx.send(box("\n".join(str(s) for s in ess)))
 
+    @padinfo.command()
+    @checks.is_owner()
+    async def lookupcache(self, ctx, clear: bool = False):
+        """Show the hit rate of the monster lookup cache, optionally clearing it afterwards"""
+        await ctx.send(box(self.lookup_cache.stats_table()))
+        if clear:
+            self.lookup_cache.clear()
+            await ctx.tick()
+
     @padinfo.command()
     @checks.is_owner()
     async def setvoicepath(self, ctx, *, path=''):
@@ -989,11 +1025,14 @@ class PadInfo(commands.Cog):
         hist_aggreg = list(self.historic_lookups)
         s = 0
         f = []
-        async for c, query in AsyncIter(enumerate(hist_aggreg)):
-            m1, err1, debug_info1 = await self.findMonsterCustom(ctx, query)
-            m2, err2, debug_info2 = await self.findMonster2(query)
-            if c % 50 == 0:
-                await ctx.send(inline("{}/{} complete.".format(c, len(hist_aggreg))))
+        flavor = await self.get_lookup_flavor(ctx)
+        results = []
+        for start in range(0, len(hist_aggreg), IDDIFF_BATCH_SIZE):
+            batch = hist_aggreg[start:start + IDDIFF_BATCH_SIZE]
+            results.extend(zip(await self.find_monsters_batch(batch, flavor),
+                               await self.find_monsters_batch(batch, 'id2')))
+            await ctx.send(inline("{}/{} complete.".format(len(results), len(hist_aggreg))))
+        for query, ((m1, err1, debug_info1), (m2, err2, debug_info2)) in zip(hist_aggreg, results):
             if m1 == m2 or (m1 and m2 and m1.monster_id == m2.monster_id):
                 s += 1
                 continue
@@ -1026,6 +1065,85 @@ class PadInfo(commands.Cog):
         await ctx.send(box(msg))
         await ctx.send('Looking for the beta test? Type `{0.prefix}idset beta y`'.format(ctx))
 
+    async def get_lookup_flavor(self, ctx) -> str:
+        """The flavor of id lookup findMonsterCustom uses for the author of ctx"""
+        return 'id3' if await self.config.user(ctx.author).beta_id3() else 'id1'
+
+    async def find_monsters_batch(self, queries, flavor='id1', server_filter=ServerFilter.any):
+        """Looks up many queries at once, returning a (monster, err, debug_info) triple for each."""
+        found = await self._lookup_batch([(flavor, query) for query in queries], server_filter)
+        return self._record_lookups(flavor, queries, found)
+
+    async def _lookup_batch(self, lookups, server_filter=ServerFilter.any):
+        """Returns the raw lookup result for each (flavor, query) pair.
+
+        Identical lookups are resolved once and cached results are reused. The rest are resolved
+        together on a worker thread against a single dadguide generation; id3 lookups also share
+        their name token matching.
+        """
+        DGCOG = self.bot.get_cog("Dadguide")
+        if DGCOG is None:
+            raise ValueError("Dadguide cog is not loaded")
+        await DGCOG.wait_until_ready()
+
+        generation = DGCOG.generation
+        token_matches = {}
+        resolvers = {}
+        for flavor, _ in lookups:
+            if flavor in resolvers:
+                continue
+            if flavor == 'id3':
+                resolvers[flavor] = (('id3',), generation.number,
+                                     lambda q: self._find_monster3_in_generation(generation, q, token_matches))
+            elif flavor in ('id1', 'id2'):
+                index = self._get_monster_index(server_filter)
+                resolvers[flavor] = ((flavor, server_filter.value), self.index_generation,
+                                     index.find_monster if flavor == 'id1' else index.find_monster2)
+            else:
+                raise ValueError("flavor must be id1, id2 or id3, not " + str(flavor))
+
+        keys = [(flavor, rmdiacritics(query).lower().strip()) for flavor, query in lookups]
+        results = {}
+        for flavor, q in dict.fromkeys(keys):
+            key_prefix, generation_number, _ = resolvers[flavor]
+            value = self.lookup_cache.get(key_prefix + (q,), generation_number)
+            if value is not MISSING:
+                results[flavor, q] = value
+        misses = [key for key in dict.fromkeys(keys) if key not in results]
+        if misses:
+            resolved = await asyncio.get_event_loop().run_in_executor(
+                None, lambda: [resolvers[flavor][2](q) for flavor, q in misses])
+            for (flavor, q), value in zip(misses, resolved):
+                key_prefix, generation_number, _ = resolvers[flavor]
+                self.lookup_cache.put(key_prefix + (q,), generation_number, value)
+                results[flavor, q] = value
+        return [results[key] for key in keys]
+
+    def _record_lookups(self, flavor, queries, results):
+        """Turns raw _lookup_batch results into (monster, err, debug_info) triples and records them"""
+        found = []
+        for query, result in zip(queries, results):
+            if flavor == 'id3':
+                m, typo_mods = result
+                for t in typo_mods:
+                    self.settings.add_typo_mod(t)
+                self.historic_lookups_id3[query] = m.monster_id if m else -1
+                found.append((m, "", "") if m else (None, "Monster not found", ""))
+            else:
+                nm, err, debug_info = result
+                historic_lookups = self.historic_lookups if flavor == 'id1' else self.historic_lookups_id2
+                historic_lookups[rmdiacritics(query)] = nm.monster_id if nm else -1
+                found.append((self.get_monster(nm.monster_id) if nm else None, err, debug_info))
+
+        # Written once for the whole batch rather than per query
+        if flavor == 'id1':
+            json.dump(self.historic_lookups, open(self.historic_lookups_file_path, "w+"))
+        elif flavor == 'id2':
+            json.dump(self.historic_lookups_id2, open(self.historic_lookups_file_path_id2, "w+"))
+        else:
+            json.dump(self.historic_lookups_id3, open(self.historic_lookups_file_path_id3, "w+"))
+        return found
+
     async def findMonsterCustom(self, ctx, query, server_filter=ServerFilter.any):
         if await self.config.user(ctx.author).beta_id3():
             m = await self.findMonster3(query)
@@ -1049,18 +1167,10 @@ class PadInfo(commands.Cog):
         return m, err, debug_info
 
     async def _findMonster(self, query, server_filter=ServerFilter.any) -> "NamedMonster":
-        while self.index_lock.locked():
-            await asyncio.sleep(1)
-
-        if server_filter.value == ServerFilter.any.value:
-            monster_index = self.index_all
-        elif server_filter.value == ServerFilter.na.value:
-            monster_index = self.index_na
-        elif server_filter.value == ServerFilter.jp.value:
-            monster_index = self.index_jp
-        else:
-            raise ValueError("server_filter must be type ServerFilter not " + str(type(server_filter)))
-        return monster_index.find_monster(query)
+        index = self._get_monster_index(server_filter)
+        return self.lookup_cache.get_or_compute(
+            ('id1', server_filter.value, rmdiacritics(query).lower().strip()), self.index_generation,
+            lambda: index.find_monster(query))
 
     async def findMonster2(self, query, server_filter=ServerFilter.any):
         query = rmdiacritics(query)
@@ -1075,18 +1185,10 @@ class PadInfo(commands.Cog):
         return m, err, debug_info
 
     async def _findMonster2(self, query, server_filter=ServerFilter.any):
-        while self.index_lock.locked():
-            await asyncio.sleep(1)
-
-        if server_filter == ServerFilter.any:
-            monster_index = self.index_all
-        elif server_filter == ServerFilter.na:
-            monster_index = self.index_na
-        elif server_filter == ServerFilter.jp:
-            monster_index = self.index_jp
-        else:
-            raise ValueError("server_filter must be type ServerFilter not " + str(type(server_filter)))
-        return monster_index.find_monster2(query)
+        index = self._get_monster_index(server_filter)
+        return self.lookup_cache.get_or_compute(
+            ('id2', server_filter.value, rmdiacritics(query).lower().strip()), self.index_generation,
+            lambda: index.find_monster2(query))
 
     async def findMonster3(self, query):
         m = await self._findMonster3(query)
@@ -1102,51 +1204,58 @@ class PadInfo(commands.Cog):
         if DGCOG is None:
             raise ValueError("Dadguide cog is not loaded")
         await DGCOG.wait_until_ready()
+        # Everything below reads from one generation, even if a refresh is published meanwhile
+        generation = DGCOG.generation
+
+        query = rmdiacritics(query).lower().strip()
+        mon, typo_mods = self.lookup_cache.get_or_compute(
+            ('id3', query), generation.number, lambda: self._find_monster3_in_generation(generation, query))
 
-        query = rmdiacritics(query).lower()
-        mod_tokens, neg_mod_tokens, name_query_tokens = find_monster.interpret_query(query, DGCOG.index2)
+        # Typos are logged on every lookup, not just the ones that miss the cache
+        for t in typo_mods:
+            self.settings.add_typo_mod(t)
 
-        for t in mod_tokens.union(neg_mod_tokens):
-            if t not in DGCOG.index2.all_modifiers:
-                self.settings.add_typo_mod(t)
+        return mon
+
+    def _find_monster3_in_generation(self, generation, query, token_matches=None):
+        """Returns the best match for a normalized query, along with the modifiers that look like typos"""
+        mod_tokens, neg_mod_tokens, name_query_tokens = find_monster.interpret_query(query, generation.index2)
+
+        typo_mods = [t for t in mod_tokens.union(neg_mod_tokens) if t not in generation.index2.all_modifiers]
 
         # print(mod_tokens, name_query_tokens)
 
         if name_query_tokens:
-            monster_gen, monster_score = find_monster.process_name_tokens(name_query_tokens, DGCOG.index2)
+            monster_gen, monster_score = find_monster.process_name_tokens(name_query_tokens, generation.index2,
+                                                                          token_matches)
             if monster_gen is None:
                 # No monsters match the given name tokens
-                return
+                return None, typo_mods
+            # Expand search to the evo tree
+            monster_gen = find_monster.get_monster_evos(generation.index2, monster_gen, monster_score)
         else:
-            # There are no name tokens in the query
-            monster_gen = {*DGCOG.database.get_all_monsters()}
+            # There are no name tokens in the query. Every evo tree is already complete, so the
+            # modifier postings can filter all monsters directly.
+            monster_gen = generation.index2.ordinals.all_bits
             monster_score = defaultdict(int)
 
-        # Expand search to the evo tree
-        monster_gen = find_monster.get_monster_evos(DGCOG.database, monster_gen, monster_score)
         monster_gen = find_monster.process_modifiers(mod_tokens, neg_mod_tokens, monster_score, monster_gen,
-                                                     DGCOG.index2.modifiers)
+                                                     generation.index2)
         if not monster_gen:
             # no modifiers match any monster in the evo tree
-            return
+            return None, typo_mods
 
         # print({k: v for k, v in sorted(monster_score.items(), key=lambda kv: kv[1], reverse=True) if k in monster_gen})
 
-        # Return most likely candidate based on query.
+        # Return most likely candidate based on query. Ties on score are broken by keys the index
+        # precomputed, only matching NA monsters on id overlap depends on the query.
+        ranking_keys = generation.index2.ranking_keys
+        na_id_overlap_bit = generation.index2.na_id_overlap_bit if re.search(r"\d{4}", query) else 0
         mon = max(monster_gen,
                   key=lambda m: (monster_score[m],
-                                 not m.is_equip,
-                                 bool(m.monster_id > 10000 and re.search(r"\d{4}", query)),  # Match na on id overlap
-                                 series_priority.get(m.series.series_type),
-                                 m.on_na if m.series.series_type == "collab" else 0,
-                                 DGCOG.database.graph.monster_is_rem_evo(m),
-                                 not all(t.value in [0, 12, 14, 15] for t in m.types),
-                                 not any(t.value in [0, 12, 14, 15] for t in m.types),
-                                 -DGCOG.database.graph.get_base_id(m),
-                                 m.rarity,
-                                 m.monster_no_na))
+                                 ranking_keys[m.monster_id] | (na_id_overlap_bit if m.monster_id > 10000 else 0)))
 
-        return mon
+        return mon, typo_mods
 
     @commands.command(aliases=["iddebug"])
     async def debugid(self, ctx, *, query):
@@ -1162,11 +1271,11 @@ class PadInfo(commands.Cog):
         o = (f"[{m.monster_id}] {m.name_en}\n"
              f"Base: [{bm.monster_id}] {bm.name_en}\n"
              f"Series: {m.series.name_en} ({m.series_id})\n\n"
-             f"[Name Tokens] {' '.join(sorted(t for t, ms in DGCOG.index2.name_tokens.items() if m in ms))}\n"
-             f"[Fluff Tokens] {' '.join(sorted(t for t, ms in DGCOG.index2.fluff_tokens.items() if m in ms))}\n\n"
+             f"[Name Tokens] {' '.join(sorted(DGCOG.index2.name_tokens.tokens_of(m)))}\n"
+             f"[Fluff Tokens] {' '.join(sorted(DGCOG.index2.fluff_tokens.tokens_of(m)))}\n\n"
              f"[Manual Tokens]\n"
-             f"     Treenames: {' '.join(sorted(t for t, ms in DGCOG.index2.manual_tree.items() if m in ms))}\n"
-             f"     Nicknames: {' '.join(sorted(t for t, ms in DGCOG.index2.manual_nick.items() if m in ms))}\n\n"
+             f"     Treenames: {' '.join(sorted(DGCOG.index2.manual_tree.tokens_of(m)))}\n"
+             f"     Nicknames: {' '.join(sorted(DGCOG.index2.manual_nick.tokens_of(m)))}\n\n"
              f"[Modifier Tokens]\n"
              f"     Attribute: {' '.join(sorted(t for t in pfxs if t in DGCOG.token_maps.COLOR_TOKENS))}\n"
              f"     Awakening: {' '.join(sorted(t for t in pfxs if t in DGCOG.token_maps.AWAKENING_TOKENS))}\n"
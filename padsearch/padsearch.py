@@ -6,11 +6,14 @@ from fnmatch import fnmatch
 from ply import lex
 from redbot.core import checks
 from redbot.core import commands
-from redbot.core.utils.chat_formatting import box, pagify
+from redbot.core.utils.chat_formatting import box, inline, pagify
 from tsutils import timeout_after
 
 logger = logging.getLogger('red.padbot-cogs.padsearch')
 
+# Most monsters [p]leaderboard will list
+LEADERBOARD_MAX_COUNT = 50
+
 HELP_MSG = """
 {0.prefix}search <specification string>
 
@@ -570,18 +573,11 @@ class SearchConfig(object):
             text = 'damage taken by {}%'.format(self.shield)
             self.filters.append(lambda m, t=text: t in m.search.active_desc)
 
-        if self.atk:
-            self.filters.append(lambda m: m.search.atk and m.search.atk >= self.atk)
-
-        if self.hp:
-            self.filters.append(lambda m: m.search.hp and m.search.hp >= self.hp)
-
-        if self.rcv:
-            self.filters.append(lambda m: m.search.rcv and m.search.rcv >= self.rcv)
-
-        if self.weighted:
-            self.filters.append(
-                lambda m: m.search.weighted_stats and m.search.weighted_stats >= self.weighted)
+        if self.atk or self.hp or self.rcv or self.weighted:
+            # Checks the lv110 stats of every monster in one go instead of one at a time
+            stat_ids = db_context.get_stats_table().monster_ids_with_stats(
+                lv=110, hp=self.hp, atk=self.atk, rcv=self.rcv, weighted=self.weighted)
+            self.filters.append(lambda m: m.monster_id in stat_ids)
 
         # Multiple
         if self.reactive:
@@ -804,6 +800,58 @@ class PadSearch(commands.Cog):
         else:
             await ctx.send(box(msg))
 
+    @commands.command(aliases=['statleaderboard'])
+    async def leaderboard(self, ctx, *, spec: str):
+        """Lists the monsters with the highest stats.
+
+        [p]leaderboard <hp|atk|rcv|weighted> [99|110|120] [297] [color] [type] [na|jp|kr] [top(n)]
+
+        Defaults to lv110 without plus eggs and the top 10, e.g.
+        [p]leaderboard weighted 110 dark dragon na
+        """
+        dg_cog = self.bot.get_cog('Dadguide')
+        if dg_cog is None:
+            await ctx.send("Dadguide cog not loaded.")
+            return
+        leaderboard = dg_cog.database.get_stat_leaderboard()
+
+        stat, lv, plus_297, count = None, 110, False, 10
+        attribute, monster_type, server = None, None, None
+        for token in spec.lower().split():
+            color = replace_named_color(token)
+            top_match = re.fullmatch(r'top\((\d+)\)', token)
+            if token in leaderboard.STATS:
+                stat = token
+            elif token.isdigit() and int(token) in leaderboard.LEVELS:
+                lv = int(token)
+            elif token in ('297', '+297'):
+                plus_297 = True
+            elif color in leaderboard.ATTRIBUTES:
+                attribute = color
+            elif token in leaderboard.TYPES:
+                monster_type = token
+            elif token in leaderboard.SERVERS:
+                server = token
+            elif top_match:
+                count = min(int(top_match.group(1)), LEADERBOARD_MAX_COUNT)
+            else:
+                await ctx.send(inline('Unexpected leaderboard option: {}'.format(token)))
+                return
+        if stat is None:
+            await ctx.send(inline('Pick a stat, one of: {}'.format(', '.join(leaderboard.STATS))))
+            return
+
+        results = leaderboard.top(count, stat, lv=lv, plus_297=plus_297, attribute=attribute,
+                                  monster_type=monster_type, server=server)
+        if not results:
+            await ctx.send(inline('No monsters matched'))
+            return
+        title = 'Top {} {} at lv{}{}'.format(len(results), stat, lv, ' +297' if plus_297 else '')
+        lines = ['{:>3}. {:>7,}  [{}] {}'.format(rank, value, m.monster_no_na, m.name_en)
+                 for rank, (m, value) in enumerate(results, 1)]
+        for page in pagify('\n'.join([title] + lines)):
+            await ctx.send(box(page))
+
     def _make_search_config(self, input):
         lexer = PadSearchLexer().build()
         lexer.input(input)
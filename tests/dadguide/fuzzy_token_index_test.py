@@ -0,0 +1,78 @@
+"""Checks FuzzyTokenIndex against a brute-force Jaro-Winkler scan over the same tokens."""
+import random
+
+from Levenshtein import jaro, jaro_winkler
+
+from dadguide.fuzzy_token_index import FuzzyTokenIndex
+
+TOKEN_JW_DISTANCE = .8
+WORDS = ('sonia ragnarok dragon zeus hera odin thor loki freyja athena anubis isis horus sakuya kirin lubu '
+         'tsubaki kali shiva parvati durga ganesha vishnu krishna yamato amaterasu tsukuyomi susano hades '
+         'persephone ares apollo artemis hermes metatron lucifer satan michael gabriel raphael uriel yog '
+         'nyarlathotep cthulhu noah fenrir valkyrie brunhild siegfried tamadra goemon hanzo nobunaga').split()
+# Non-ASCII tokens all share the signature's catch-all column
+NON_ASCII = ['ゼウス', 'ゼウスの', 'ジャ', 'ジャ12', 'über', 'uber', 'señor', 'senor', 'ラー', 'éclair']
+# Tokens sharing 5 or more leading characters, which the bound has to let through regardless
+SHARED_PREFIX = ['ragnarok', 'ragnarokd', 'ragnarokdragon', 'ragnarokdragonknight', 'ragnar', 'valkyriececilia',
+                 'valkyrieclaire', 'dragonkiller', 'dragonkin', 'dragonbound']
+
+
+def jaro_winkler_uncapped(a, b, prefix_weight=.05):
+    """Jaro-Winkler without the usual cap of 4 prefix characters, as some library versions compute it"""
+    similarity = jaro(a, b)
+    prefix = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        prefix += 1
+    return min(1.0, similarity + (1 - similarity) * prefix * prefix_weight)
+
+
+def mutate(rnd, token):
+    chars = list(token)
+    for _ in range(rnd.randint(0, 3)):
+        i = rnd.randrange(len(chars) + 1)
+        op = rnd.randint(0, 2)
+        if op == 0:
+            chars.insert(i, rnd.choice('abcdeghilnorstuz1ウ'))
+        elif chars and op == 1:
+            del chars[min(i, len(chars) - 1)]
+        elif chars:
+            chars[min(i, len(chars) - 1)] = rnd.choice('aeiouxyzス')
+    return ''.join(chars) or 'q'
+
+
+def tokens_and_queries():
+    rnd = random.Random(17)
+    tokens = WORDS + NON_ASCII + SHARED_PREFIX + ['a', 'x1', '12', '5000', '10003']
+    tokens += [mutate(rnd, rnd.choice(WORDS)) + rnd.choice(('', '', rnd.choice(WORDS))) for _ in range(1000)]
+    # Duplicates have to come back as many times as they're in the list
+    tokens += rnd.sample(tokens, 50)
+    queries = NON_ASCII + SHARED_PREFIX + ['', 'a', 'x', 'zzzz', 'ragnarokdragonknightx']
+    queries += [mutate(rnd, rnd.choice(tokens)) for _ in range(1500)]
+    return tokens, queries
+
+
+def test_candidates_cover_full_scan():
+    tokens, queries = tokens_and_queries()
+    index = FuzzyTokenIndex(tokens)
+    for jw in (lambda a, b: jaro_winkler(a, b, .05), jaro_winkler_uncapped):
+        for query in queries:
+            expected = [t for t in tokens if jw(query, t) > TOKEN_JW_DISTANCE]
+            candidates = index.jaro_winkler_candidates(query, TOKEN_JW_DISTANCE)
+            assert [t for t in candidates if jw(query, t) > TOKEN_JW_DISTANCE] == expected, query
+
+
+def test_candidates_are_narrowed():
+    tokens, queries = tokens_and_queries()
+    index = FuzzyTokenIndex(tokens)
+    candidates = sum(len(index.jaro_winkler_candidates(q, TOKEN_JW_DISTANCE)) for q in queries)
+    assert candidates < len(tokens) * len(queries) / 4
+
+
+def test_prefixed_and_contains():
+    tokens, queries = tokens_and_queries()
+    index = FuzzyTokenIndex(tokens)
+    for query in queries + tokens[:100] + ['ragn', 'dragon', 'ゼ']:
+        assert index.prefixed(query) == [t for t in tokens if t.startswith(query)], query
+        assert (query in index) == (query in tokens), query
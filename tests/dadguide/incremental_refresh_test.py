@@ -0,0 +1,265 @@
+"""Checks that patching a generation for a changed dump gives the same result as building from scratch.
+
+Mirrors Dadguide._refresh_incrementally on two small dumps that differ by a handful of rows.
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+import sqlite3
+import tempfile
+
+from dadguide.database_context import DbContext
+from dadguide.database_diff import diff_databases
+from dadguide.database_manager import DadguideDatabase
+from dadguide.monster_graph import MonsterGraph
+from dadguide.monster_index import MonsterIndex2, NICKNAME_OVERRIDES_SHEET, \
+    GROUP_TREENAMES_OVERRIDES_SHEET, PANTHNAME_OVERRIDES_SHEET, NAME_TOKEN_ALIAS_SHEET
+from dadguide.old_monster_index import MonsterIndex
+
+SCHEMA = """
+CREATE TABLE monsters (monster_id INTEGER PRIMARY KEY, monster_no_jp INT, monster_no_na INT, monster_no_kr INT,
+  leader_skill_id INT, active_skill_id INT, series_id INT, attribute_1_id INT, attribute_2_id INT,
+  name_ja TEXT, name_en TEXT, name_ko TEXT, name_en_override TEXT, rarity INT, buy_mp INT, sell_mp INT,
+  sell_gold INT, reg_date TEXT, on_jp INT, on_na INT, on_kr INT, type_1_id INT, type_2_id INT, type_3_id INT,
+  inheritable INT, orb_skin_id INT, cost INT, level INT, exp INT, fodder_exp INT, limit_mult INT,
+  pronunciation_ja TEXT, voice_id_jp INT, voice_id_na INT, hp_max INT, hp_min INT, hp_scale REAL,
+  atk_max INT, atk_min INT, atk_scale REAL, rcv_max INT, rcv_min INT, rcv_scale REAL, latent_slots INT,
+  has_animation INT, has_hqimage INT, linked_monster_id INT, tstamp INT);
+CREATE TABLE leader_skills (leader_skill_id INTEGER PRIMARY KEY, name_ja TEXT, name_en TEXT, name_ko TEXT,
+  desc_ja TEXT, desc_en TEXT, desc_ko TEXT, max_hp REAL, max_atk REAL, max_rcv REAL, max_shield REAL,
+  max_combos INT, bonus_damage INT, mult_bonus_damage INT, extra_time REAL, tstamp INT);
+CREATE TABLE active_skills (active_skill_id INTEGER PRIMARY KEY, name_ja TEXT, name_en TEXT, name_ko TEXT,
+  desc_ja TEXT, desc_en TEXT, desc_ko TEXT, turn_max INT, turn_min INT, tstamp INT);
+CREATE TABLE series (series_id INTEGER PRIMARY KEY, name_ja TEXT, name_en TEXT, name_ko TEXT, series_type TEXT,
+  tstamp INT);
+CREATE TABLE exchanges (exchange_id INTEGER PRIMARY KEY, target_monster_id INT, tstamp INT);
+CREATE TABLE drops (drop_id INTEGER PRIMARY KEY, monster_id INT, dungeon_id INT, tstamp INT);
+CREATE TABLE evolutions (evolution_id INTEGER PRIMARY KEY, evolution_type INT, from_id INT, to_id INT,
+  mat_1_id INT, mat_2_id INT, mat_3_id INT, mat_4_id INT, mat_5_id INT, tstamp INT);
+CREATE TABLE awoken_skills (awoken_skill_id INTEGER PRIMARY KEY, name_ja TEXT, name_en TEXT, name_ko TEXT,
+  desc_ja TEXT, desc_en TEXT, desc_ko TEXT, adj_hp INT, adj_atk INT, adj_rcv INT, tstamp INT);
+CREATE TABLE awakenings (awakening_id INTEGER PRIMARY KEY, monster_id INT, awoken_skill_id INT, is_super INT,
+  order_idx INT, tstamp INT);
+CREATE TABLE d_egg_machine_types (egg_machine_type_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE egg_machines (egg_machine_id INTEGER PRIMARY KEY, egg_machine_type_id INT, contents TEXT,
+  tstamp INT);
+"""
+
+MONSTER_COLUMNS = (
+    'monster_id', 'monster_no_jp', 'monster_no_na', 'monster_no_kr', 'leader_skill_id', 'active_skill_id',
+    'series_id', 'attribute_1_id', 'attribute_2_id', 'name_ja', 'name_en', 'name_ko', 'name_en_override',
+    'rarity', 'buy_mp', 'sell_mp', 'sell_gold', 'reg_date', 'on_jp', 'on_na', 'on_kr', 'type_1_id',
+    'type_2_id', 'type_3_id', 'inheritable', 'orb_skin_id', 'cost', 'level', 'exp', 'fodder_exp',
+    'limit_mult', 'pronunciation_ja', 'voice_id_jp', 'voice_id_na', 'hp_max', 'hp_min', 'hp_scale',
+    'atk_max', 'atk_min', 'atk_scale', 'rcv_max', 'rcv_min', 'rcv_scale', 'latent_slots', 'has_animation',
+    'has_hqimage', 'linked_monster_id', 'tstamp')
+
+# (monster_id, name_en, name_ja, series_id, attribute_1_id, type_1_id, rarity)
+MONSTERS = [
+    (1, 'Zeus', 'ゼウス', 1, 3, 1, 5),
+    (2, 'Awoken Zeus', '覚醒ゼウス', 1, 3, 1, 6),
+    (3, 'Odin', 'オーディン', 2, 4, 5, 5),
+    (4, 'Odin, the Allfather', 'オーディン改', 2, 4, 5, 6),
+    (5, 'Odin Gem', 'オーディンの希石', 2, 4, 0, 4),
+    (6, 'Tamadra', 'たまドラ', 3, 0, 14, 1),
+    (7, 'Sonia', 'ソニア', 4, 0, 2, 5),
+    (8, 'Sonia, Dragon Caller', 'ソニア転生', 4, 0, 2, 7),
+    (9, 'Hera', 'ヘラ', 1, 4, 1, 5),
+    (10003, 'Odin', 'オーディン', 2, 4, 5, 5),
+]
+
+
+def monster_row(monster_id, name_en, name_ja, series_id, attribute_1_id, type_1_id, rarity):
+    jp_only = monster_id > 10000
+    row = dict.fromkeys(MONSTER_COLUMNS)
+    row.update(monster_id=monster_id, monster_no_jp=monster_id % 10000, monster_no_na=monster_id,
+               monster_no_kr=monster_id, leader_skill_id=1, active_skill_id=1, series_id=series_id,
+               attribute_1_id=attribute_1_id, attribute_2_id=None, name_ja=name_ja, name_en=name_en,
+               rarity=rarity, sell_mp=10, sell_gold=100, reg_date='2020-01-01', on_jp=1,
+               on_na=0 if jp_only else 1, on_kr=1, type_1_id=type_1_id, inheritable=1, cost=10, level=99,
+               exp=4000000, fodder_exp=500, limit_mult=0, voice_id_jp=monster_id, hp_max=3000, hp_min=300,
+               hp_scale=1.0, atk_max=1500, atk_min=150, atk_scale=1.0, rcv_max=300, rcv_min=30,
+               rcv_scale=1.0, latent_slots=6, has_animation=0, has_hqimage=1, tstamp=1)
+    return [row[c] for c in MONSTER_COLUMNS]
+
+
+def write_dump(path, monsters, evolutions, awakenings, egg_contents):
+    con = sqlite3.connect(path)
+    con.executescript(SCHEMA)
+    con.executemany('INSERT INTO series VALUES (?,?,?,?,?,?)', [
+        (1, 'ギリシャ', 'Greek Gods', None, 'regular', 1),
+        (2, '北欧', 'Norse', None, 'event', 1),
+        (3, 'たま', 'Tamadra', None, None, 1),
+        (4, 'ソニア', 'Dragon Callers', None, 'collab', 1),
+        (5, '空', 'Empty Series', None, 'seasonal', 1),
+    ])
+    con.execute("INSERT INTO leader_skills VALUES (1, 'ls', 'LS', NULL, 'ja', 'ATK x2.',"
+                " NULL, 1, 2, 1, 0, 0, 0, 0, 0, 1)")
+    con.execute("INSERT INTO active_skills VALUES (1, 'as', 'AS', NULL, 'ja', 'Delay enemies for 3 turns.',"
+                " NULL, 10, 5, 1)")
+    con.executemany('INSERT INTO awoken_skills VALUES (?,?,?,?,?,?,?,?,?,?,?)',
+                    [(i, 'aw', 'Awakening {}'.format(i), None, 'd', 'desc', None, 0, 0, 0, 1)
+                     for i in range(1, 11)])
+    con.executemany('INSERT INTO monsters VALUES ({})'.format(','.join('?' * len(MONSTER_COLUMNS))),
+                    [monster_row(*m) for m in monsters])
+    con.executemany('INSERT INTO evolutions VALUES (?,?,?,?,?,?,?,?,?,?)',
+                    [(i, evo_type, from_id, to_id, 6, None, None, None, None, 1)
+                     for i, (evo_type, from_id, to_id) in enumerate(evolutions, 1)])
+    con.executemany('INSERT INTO awakenings VALUES (?,?,?,?,?,?)',
+                    [(i, monster_id, skill_id, 0, i, 1) for i, (monster_id, skill_id) in enumerate(awakenings, 1)])
+    con.execute('INSERT INTO exchanges VALUES (1, 5, 1)')
+    con.execute('INSERT INTO drops VALUES (1, 6, 1, 1)')
+    con.executemany('INSERT INTO d_egg_machine_types VALUES (?,?)', [(1, 'PEM'), (2, 'REM')])
+    con.executemany('INSERT INTO egg_machines VALUES (?,?,?,1)',
+                    [(i, type_id, json.dumps(['({})'.format(m) for m in ids]))
+                     for i, (type_id, ids) in enumerate(egg_contents, 1)])
+    con.commit()
+    con.close()
+
+
+OLD_EVOLUTIONS = [(1, 1, 2), (1, 3, 4)]
+OLD_AWAKENINGS = [(1, 1), (1, 2), (2, 3), (4, 4), (7, 5), (8, 6)]
+OLD_EGGS = [(1, [1, 7]), (2, [9])]
+
+
+def write_dumps(tmp_dir):
+    old_file = os.path.join(tmp_dir, 'old.sqlite')
+    new_file = os.path.join(tmp_dir, 'new.sqlite')
+    write_dump(old_file, MONSTERS, OLD_EVOLUTIONS, OLD_AWAKENINGS, OLD_EGGS)
+
+    monsters = [m for m in MONSTERS if m[0] != 5]
+    # Renaming the gem moves it from Odin to Zeus
+    monsters.append((5, 'Zeus Gem', 'ゼウスの希石', 1, 3, 0, 4))
+    # A JP only version of Hera appears, giving her the idjp modifier
+    monsters.append((10009, 'Hera', 'ヘラ', 1, 4, 1, 5))
+    write_dump(new_file, monsters,
+               OLD_EVOLUTIONS + [(3, 7, 8)],
+               [a if a != (4, 4) else (4, 8) for a in OLD_AWAKENINGS],
+               [(1, [1, 7]), (2, [9, 6])])
+    return old_file, new_file
+
+
+NICKNAMES = {2: {'azeus'}, 8: {'revo sonia'}}
+TREENAMES = {3: {'odin'}}
+PANTHNAMES = {'greek': 'greek gods', 'greek gods': 'greek gods'}
+SHEETS = {
+    NICKNAME_OVERRIDES_SHEET: [['2', 'azeus', '', ''], ['8', 'dragon caller sonia', '', '']],
+    GROUP_TREENAMES_OVERRIDES_SHEET: [['3', 'odin', '', '']],
+    PANTHNAME_OVERRIDES_SHEET: [['1', 'greek'], ['4', 'dragon callers']],
+    NAME_TOKEN_ALIAS_SHEET: [['token', 'alias'], ['sonia', 'sonya']],
+}
+
+
+class StaticFetcher(object):
+    def csv_reader(self, url):
+        f = io.StringIO()
+        csv.writer(f).writerows(SHEETS[url])
+        return csv.reader(io.StringIO(f.getvalue()), delimiter=',')
+
+
+def load(data_file, base_graph=None, changed_monster_ids=None):
+    database = DadguideDatabase(data_file)
+    if base_graph is None:
+        return DbContext(database, MonsterGraph(database))
+    return DbContext(database, MonsterGraph(database, base_graph=base_graph,
+                                            changed_monster_ids=changed_monster_ids))
+
+
+async def build_indexes(db):
+    index = await MonsterIndex(db, NICKNAMES, TREENAMES, dict(PANTHNAMES))
+    index2 = await MonsterIndex2(db.get_all_monsters(False), db, StaticFetcher())
+    return index, index2
+
+
+def graph_state(db):
+    graph = db.graph
+    state = {}
+    for m in db.get_all_monsters():
+        mid = m.monster_id
+        evo = graph.get_evo_by_monster_id(mid)
+        state[mid] = (
+            m.name_en, m.name_ja, m.series_id, m.evo_gem_id, [a.awoken_skill_id for a in m.awakenings],
+            sorted(graph.get_alt_ids_by_id(mid)), graph.get_base_id_by_id(mid),
+            evo and (evo.from_id, evo.to_id, evo.evolution_type),
+            graph.get_prev_evolution_by_monster_id(mid), sorted(graph.get_next_evolutions_by_monster_id(mid)),
+            graph.cur_evo_type_by_monster_id(mid), graph.true_evo_type_by_monster_id(mid),
+            graph.monster_is_farmable_by_id(mid), graph.monster_is_pem_evo_by_id(mid),
+            graph.monster_is_rem_evo_by_id(mid),
+        )
+    return state
+
+
+def index_state(index):
+    return {
+        'entries': {k: nm.monster_id for k, nm in index.all_entries.items()},
+        'two_word_entries': {k: nm.monster_id for k, nm in index.two_word_entries.items()},
+        'prefixes': index.all_prefixes,
+        'pantheons': {k: {nm.monster_id for nm in v} for k, v in index.pantheons.items()},
+    }
+
+
+def index2_state(index2):
+    def postings(p):
+        return {token: sorted(m.monster_id for m in p.monsters(token)) for token in p if p.bits(token)}
+
+    ordinals = index2.ordinals
+    return {
+        'monsters': sorted(m.monster_id for m in ordinals.decode(ordinals.all_bits)),
+        'name_tokens': postings(index2.name_tokens),
+        'fluff_tokens': postings(index2.fluff_tokens),
+        'manual_nick': postings(index2.manual_nick),
+        'manual_tree': postings(index2.manual_tree),
+        'modifier_postings': postings(index2.modifier_postings),
+        'modifiers': {m.monster_id: mods for m, mods in index2.modifiers.items()},
+        'all_name_tokens': sorted(index2.all_name_tokens),
+        'multi_word_tokens': index2.multi_word_tokens,
+        'ranking_keys': index2.ranking_keys,
+        'na_id_overlap_bit': index2.na_id_overlap_bit,
+        'tree_bits': {tree: sorted(m.monster_id for m in ordinals.decode(bits))
+                      for tree, bits in index2.tree_bits.items()},
+    }
+
+
+async def patched_and_full(tmp_dir):
+    old_file, new_file = write_dumps(tmp_dir)
+    old_db = load(old_file)
+    old_index, old_index2 = await build_indexes(old_db)
+
+    delta = diff_databases(old_file, new_file)
+    patched_db = load(new_file, base_graph=old_db.graph, changed_monster_ids=delta.monster_ids)
+    tree_ids = delta.affected_tree_ids(old_db.graph, patched_db.graph)
+    patched_index = await old_index.patched(patched_db, tree_ids, NICKNAMES, TREENAMES, dict(PANTHNAMES))
+    patched_index2 = await old_index2.patched(patched_db, tree_ids)
+
+    full_db = load(new_file)
+    full_index, full_index2 = await build_indexes(full_db)
+    return delta, (patched_db, patched_index, patched_index2), (full_db, full_index, full_index2)
+
+
+def test_delta_covers_changed_rows():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        delta = diff_databases(*write_dumps(tmp_dir))
+    # 5 was renamed, moving its gem from Odin (3, and 10003 which shares its name) to Zeus (1),
+    # 7 and 8 gained an evo edge, 4 had an awakening swapped, 6 entered the REM and 10009 was added
+    assert delta.monster_ids == {1, 3, 4, 5, 6, 7, 8, 10003, 10009}
+    assert not delta.table_changed('series')
+
+
+def test_patched_generation_matches_full_build():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        delta, patched, full = asyncio.run(patched_and_full(tmp_dir))
+    patched_db, patched_index, patched_index2 = patched
+    full_db, full_index, full_index2 = full
+
+    assert graph_state(patched_db) == graph_state(full_db)
+    assert index_state(patched_index) == index_state(full_index)
+    assert index2_state(patched_index2) == index2_state(full_index2)
+
+    # The changes themselves made it through, not just equally stale copies of them
+    assert full_db.graph.get_monster(1).evo_gem_id == 5
+    assert full_db.graph.get_monster(3).evo_gem_id is None
+    assert 8 in full_db.graph.get_alt_ids_by_id(7)
+    assert full_db.graph.monster_is_rem_evo_by_id(6)
+    assert 'idjp' in full_index2.modifiers[full_db.graph.get_monster(9)]
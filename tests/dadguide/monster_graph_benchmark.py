@@ -0,0 +1,34 @@
+"""Times MonsterGraph.build_graph and measures its peak Python allocations.
+
+Usage: python -m tests.dadguide.monster_graph_benchmark path/to/dadguide.sqlite [runs]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+
+from dadguide.database_manager import DadguideDatabase
+from dadguide.monster_graph import MonsterGraph
+
+data_file = sys.argv[1]
+runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+database = DadguideDatabase(data_file)
+
+timings = []
+for _ in range(runs):
+    gc.collect()
+    start = time.perf_counter()
+    graph = MonsterGraph(database)
+    timings.append(time.perf_counter() - start)
+    del graph
+
+gc.collect()
+tracemalloc.start()
+graph = MonsterGraph(database)
+_, peak = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+
+print('{} monsters'.format(len(graph._monsters)))
+print('build_graph: best {:.3f}s, median {:.3f}s over {} runs'.format(
+    min(timings), sorted(timings)[len(timings) // 2], runs))
+print('build_graph peak allocations: {:.1f} MiB'.format(peak / (1 << 20)))
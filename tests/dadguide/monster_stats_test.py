@@ -0,0 +1,65 @@
+"""Checks that MonsterStatsTable computes the same stats as MonsterStats does one monster at a time."""
+import random
+
+from dadguide.models.monster_stats import MonsterStatModifierInput, MonsterStats, MonsterStatsTable
+
+LEVELS = (1, 50, 99, 110, 120)
+PLUSES = (0, 297, (99, 0, 45))
+LATENTS = (
+    None,
+    MonsterStatModifierInput(num_hp=2, num_atk=1, num_rcv=3, num_all_stat=1),
+    MonsterStatModifierInput(num_hppp=1, num_atkpp=2, num_rcvpp=1, num_hp_awakening=2, num_atk_awakening=1,
+                             num_rcv_awakening=3, num_voice_awakening=1),
+)
+
+
+class StatsModel(object):
+    """The fields of MonsterModel that stat formulas read"""
+
+    def __init__(self, rnd: random.Random, monster_id: int):
+        self.monster_id = monster_id
+        for key, top in (('hp', 8000), ('atk', 4000), ('rcv', 1500)):
+            low = rnd.randint(0, top // 5)
+            setattr(self, key + '_min', low)
+            setattr(self, key + '_max', rnd.randint(low, top))
+            setattr(self, key + '_scale', rnd.choice((0.7, 1.0, 1.5, rnd.uniform(0.5, 2))))
+        self.level = rnd.choice((1, 5, 50, 99, 99, 110, 120))
+        self.limit_mult = rnd.choice((0, 0, 10, 11, 15, 30))
+        self.is_equip = rnd.random() < .1
+        # Enhanced hp/atk/rcv and voice awakenings are the ones stats() counts by itself
+        self.awakening_ids = [rnd.choice((1, 2, 3, 63, 10, 21)) for _ in range(rnd.randint(0, 9))]
+
+    def awakening_count(self, awoken_skill_id):
+        return self.awakening_ids.count(awoken_skill_id)
+
+
+def test_stats_table_matches_monster_stats():
+    rnd = random.Random(14)
+    models = [StatsModel(rnd, monster_id) for monster_id in range(1, 3001)]
+    table = MonsterStatsTable(models)
+    monster_stats = MonsterStats()
+
+    for lv in LEVELS:
+        for plus in PLUSES:
+            for inherit in (False, True):
+                for stat_latents in LATENTS:
+                    columns = table.stats(lv=lv, plus=plus, inherit=inherit, stat_latents=stat_latents)
+                    for i, m in enumerate(models):
+                        expected = monster_stats.stats(m, lv=lv, plus=plus, inherit=inherit,
+                                                       stat_latents=stat_latents)
+                        assert tuple(int(c[i]) for c in columns) == expected, \
+                            (m.monster_id, lv, plus, inherit, stat_latents)
+
+
+def test_monster_ids_with_stats_filters_on_table_stats():
+    rnd = random.Random(15)
+    models = [StatsModel(rnd, monster_id) for monster_id in range(1, 501)]
+    table = MonsterStatsTable(models)
+    monster_stats = MonsterStats()
+
+    expected = set()
+    for m in models:
+        hp, atk, rcv, weighted = monster_stats.stats(m, lv=110)
+        if hp >= 3000 and rcv >= 400:
+            expected.add(m.monster_id)
+    assert table.monster_ids_with_stats(lv=110, hp=3000, rcv=400) == expected
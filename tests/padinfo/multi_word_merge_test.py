@@ -0,0 +1,87 @@
+"""Checks that merging multi-word tokens through MultiWordTrie matches the sorted-list loop it replaced."""
+import random
+
+from dadguide.multi_word_trie import MultiWordTrie
+from padinfo.find_monster import FindMonster, calc_ratio
+
+WORDS = ('sonia ragnarok dragon zeus hera odin thor loki freyja athena anubis isis horus sakuya kirin lubu '
+         'tsubaki kali shiva parvati durga ganesha vishnu krishna yamato amaterasu tsukuyomi susano hades '
+         'persephone ares apollo artemis hermes metatron lucifer satan michael gabriel raphael uriel yog '
+         'nyarlathotep cthulhu noah fenrir valkyrie brunhild siegfried tamadra goemon hanzo nobunaga').split()
+
+
+def merge_with_sorted_list(tokens, valid_multi_word_tokens):
+    """FindMonster._merge_multi_word_tokens as it was before the trie"""
+    result = []
+    s = 0
+    multi_word_tokens_sorted = sorted(valid_multi_word_tokens,
+                                      key=lambda x: (len(x), len(''.join(x))),
+                                      reverse=True)
+    for c1, token in enumerate(tokens):
+        if s:
+            s -= 1
+            continue
+        for mwt in multi_word_tokens_sorted:
+            if len(mwt) > len(tokens) - c1:
+                continue
+            for c2, t in enumerate(mwt):
+                if (tokens[c1 + c2] != t and len(t) < 5) or calc_ratio(tokens[c1 + c2], t) < FindMonster.TOKEN_JW_DISTANCE:
+                    break
+            else:
+                s = len(mwt) - 1
+                result.append("".join(mwt))
+                break
+        else:
+            result.append(token)
+    return result
+
+
+def typo(rnd, word):
+    chars = list(word)
+    i = rnd.randrange(len(chars))
+    if rnd.random() < .5:
+        chars[i] = rnd.choice('aeiouy')
+    else:
+        del chars[i]
+    return ''.join(chars) or word
+
+
+def multi_word_tokens(rnd):
+    tokens = {tuple(rnd.sample(WORDS, rnd.choice((2, 2, 3)))) for _ in range(300)}
+    # Single words, which match on their own
+    tokens |= {('zeus',), ('valkyrie',), ('sakuya',)}
+    # Short words that have to match exactly
+    tokens |= {('ra', 'dragon'), ('lu', 'bu'), ('cao', 'cao'), ('odin', 'thor'), ('yog', 'loki', 'zeus')}
+    # Rank ties: same word count and total length, so the set's order decides between them
+    tokens |= {('hera', 'zeus'), ('zeus', 'hera'), ('hera', 'odin'), ('odin', 'hera'), ('sonia', 'anubis'),
+               ('sonya', 'anubis')}
+    # More than 16 fuzzy words under one node, which puts a FuzzyTokenIndex on it
+    tokens |= {('dragon', w) for w in WORDS if len(w) >= 5}
+    return tokens
+
+
+def queries(rnd, tokens):
+    tokens = list(tokens)
+    result = [['ra', 'dragon'], ['ra', 'dragn'], ['rah', 'dragon'], ['lu', 'bu'], ['lub', 'bu'], ['hera', 'zeus'],
+              ['zeus', 'hera', 'odin'], ['sonia', 'anubis'], ['sonja', 'anubis'], ['dragon', 'ragnarok']]
+    for _ in range(2000):
+        query = []
+        for _ in range(rnd.randint(1, 3)):
+            if rnd.random() < .6:
+                query += [typo(rnd, w) if rnd.random() < .3 else w for w in rnd.choice(tokens)]
+            else:
+                query.append(rnd.choice(WORDS))
+        result.append(query)
+    return result
+
+
+def test_trie_merges_like_sorted_list():
+    rnd = random.Random(19)
+    valid_multi_word_tokens = multi_word_tokens(rnd)
+    trie = MultiWordTrie(valid_multi_word_tokens)
+    assert trie.root.children['dragon'].fuzzy_index is not None
+
+    find_monster = FindMonster()
+    for query in queries(rnd, valid_multi_word_tokens):
+        assert find_monster._merge_multi_word_tokens(query, trie) == \
+               merge_with_sorted_list(query, valid_multi_word_tokens), query